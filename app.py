@@ -6,6 +6,7 @@ from flask_cors import CORS
 from dotenv import load_dotenv
 import xrpl_utilities
 import database
+import passwords
 
 load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
@@ -13,6 +14,10 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 app = Flask(__name__)
 CORS(app)
 
+@app.teardown_appcontext
+def release_database_connection(exc):
+    database.release_connection()
+
 #Address to test functions: rPT1Sjq2YGrBMTttX4GZHjKu9dyfzbpAYe
 #login
 @app.route("/api/login", methods=['POST']) # Need to change to email instead of username
@@ -21,7 +26,12 @@ def login():
     username = data.get("username")
     password = data.get("password")
     
-    if database.validate_user_login(username, password):
+    try:
+        valid = database.validate_user_login(username, password)
+    except passwords.PasswordServiceBusy as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
+
+    if valid:
         payload = {
         'username': username,
         'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=1)
@@ -0,0 +1,239 @@
+# Async-native serving mode for the read-only /xrp/* routes.
+#
+# The routes mirror main.py (same paths, parameters and JSON shapes) but run on a
+# single event loop over pooled AsyncJsonRpcClient connections, so one process can
+# hold thousands of in-flight rippled requests. Run with:
+#
+#     uvicorn asgi:app --workers 4
+#
+# The Flask app in main.py keeps serving everything else.
+import asyncio
+import datetime
+import json
+import time
+from urllib.parse import parse_qs
+
+import database
+import db
+import metrics
+import xrpl_async
+import xrpl_registry
+
+routes = {}
+
+
+def route(path, methods=("GET",)):
+    def register(handler):
+        for method in methods:
+            routes[(path, method)] = handler
+        return handler
+    return register
+
+
+class Request:
+    def __init__(self, scope, receive):
+        self.scope = scope
+        self.receive = receive
+        self.args = {key: values[0] for key, values in parse_qs(scope["query_string"].decode("latin-1")).items()}
+
+    async def json(self):
+        body = b""
+        while True:
+            message = await self.receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                return json.loads(body or b"null")
+
+
+class JSONResponse:
+    content_type = b"application/json"
+
+    def __init__(self, payload, status=200):
+        self.body = json.dumps(payload).encode("utf-8")
+        self.status = status
+
+    async def __call__(self, send):
+        await send({
+            "type": "http.response.start",
+            "status": self.status,
+            "headers": [(b"content-type", self.content_type), (b"content-length", str(len(self.body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": self.body})
+
+
+class TextResponse(JSONResponse):
+    def __init__(self, text, content_type, status=200):
+        self.body = text.encode("utf-8")
+        self.content_type = content_type.encode()
+        self.status = status
+
+
+class StreamingResponse:
+    status = 200
+
+    def __init__(self, chunks, media_type):
+        self.chunks = chunks
+        self.media_type = media_type
+
+    async def __call__(self, send):
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", self.media_type.encode())],
+        })
+        async for chunk in self.chunks:
+            await send({"type": "http.response.body", "body": chunk.encode("utf-8"), "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await xrpl_registry.get_async_client().close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+
+    start = time.perf_counter()
+    handler = routes.get((scope["path"], scope["method"]))
+    if handler is None:
+        response = JSONResponse({"error": "Not found"}, 404)
+    else:
+        try:
+            response = await handler(Request(scope, receive))
+        except Exception as e:
+            print(e)
+            response = JSONResponse({'error': 'Unknown error'}, 500)
+    await response(send)
+    route = scope["path"] if handler is not None else "unmatched"
+    metrics.observe_request(route, scope["method"], response.status, time.perf_counter() - start)
+
+
+# Prometheus scrape endpoint for this process
+@route("/metrics")
+async def metrics_endpoint(request):
+    return TextResponse(metrics.render(), metrics.CONTENT_TYPE)
+
+
+# Get XRP balance for an address
+@route("/xrp/get_balance")
+async def get_balance(request):
+    try:
+        balance = await xrpl_async.get_balance(request.args.get("address"))
+        return JSONResponse({"balance": balance})
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, 400)
+
+
+# Get XRP balances and account info for many addresses in one call
+@route("/xrp/get_balances", methods=("POST",))
+async def get_balances(request):
+    data = await request.json()
+    addresses = data["addresses"]
+    if not isinstance(addresses, list):
+        return JSONResponse({"error": "addresses must be a list"}, 400)
+    if len(addresses) > xrpl_async.MAX_BATCH_ADDRESSES:
+        return JSONResponse({"error": f"At most {xrpl_async.MAX_BATCH_ADDRESSES} addresses per request"}, 400)
+
+    account_info, errors = await xrpl_async.get_account_info_batch(addresses)
+    results = {
+        address: {
+            "balance": float(account_data["Balance"]) / 1000000,
+            "account_data": account_data,
+        }
+        for address, account_data in account_info.items()
+    }
+    return JSONResponse({"results": results, "errors": errors})
+
+
+# Get trustlines for an address
+@route("/xrp/get_trustlines")
+async def get_trustlines(request):
+    try:
+        trustlines = await xrpl_async.get_trustlines(request.args.get("address"))
+        return JSONResponse({"Trustlines": trustlines})
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, 400)
+
+
+# Summarize trustlines for an address
+@route("/xrp/summarize_trustlines")
+async def summarize(request):
+    summary = await xrpl_async.summarize_trustlines(request.args.get("address"))
+    return JSONResponse(summary)
+
+
+# Get transaction history for an address (same parameters as main.py)
+HISTORY_FILTERS = ("start", "end", "tx_type", "counterparty")
+
+@route("/xrp/get_transaction_history")
+async def get_transaction_history(request):
+    args = request.args
+    address = args.get("address")
+    cursor = args.get("cursor")
+    if args.get("stream") in ("1", "true"):
+        page_size = min(int(args.get("limit", 200)), 400)
+        return StreamingResponse(_stream_transaction_history(address, page_size), "application/x-ndjson")
+
+    limit = min(int(args.get("limit", 10)), 400)
+    # Only our own wallets are indexed, so callers can't make us backfill arbitrary accounts
+    indexed = args.get("source") != "ledger" and await asyncio.to_thread(db.wallet_exists, address)
+    if not indexed and any(args.get(name) for name in HISTORY_FILTERS):
+        return JSONResponse({"error": "Filters are only available for Riverr wallets"}, 400)
+    try:
+        if indexed:
+            before = xrpl_async.Transaction.decode_index_cursor(cursor)
+        else:
+            xrpl_async.Transaction.decode_ledger_cursor(cursor)
+    except ValueError:
+        return JSONResponse({"error": "Invalid cursor"}, 400)
+    try:
+        start = _parse_timestamp(args.get("start"))
+        end = _parse_timestamp(args.get("end"))
+    except ValueError:
+        return JSONResponse({"error": "start and end must be ISO dates"}, 400)
+    try:
+        if not indexed:
+            transaction_history, next_cursor = await xrpl_async.get_transaction_history_page(address, limit, cursor)
+        else:
+            # The local index is SQLite; keep its sync and query off the event loop
+            # A new wallet's first pages sync here; the rest backfills in the background
+            await asyncio.to_thread(
+                database.sync_transaction_history, address, max_pages=database.HISTORY_SYNC_PAGES)
+            transaction_history, next_before = await asyncio.to_thread(
+                database.query_transaction_history,
+                address,
+                start=start,
+                end=end,
+                tx_type=args.get("tx_type"),
+                counterparty=args.get("counterparty"),
+                limit=limit,
+                before=before,
+            )
+            next_cursor = xrpl_async.Transaction.encode_cursor(next_before)
+        return JSONResponse({"Transaction History": transaction_history, "next_cursor": next_cursor})
+    except Exception as e:
+        return JSONResponse({"error": str(e)})
+
+
+async def _stream_transaction_history(address, page_size):
+    try:
+        async for transaction in xrpl_async.iter_transaction_history(address, page_size):
+            yield json.dumps(transaction) + "\n"
+    except Exception as e:
+        print(e)
+        yield json.dumps({"error": str(e)}) + "\n"
+
+
+def _parse_timestamp(value):
+    if not value:
+        return None
+    parsed = datetime.datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return int(parsed.timestamp())
@@ -0,0 +1,45 @@
+import functools
+import os
+
+import jwt
+from dotenv import load_dotenv
+from flask import g, jsonify, request
+
+from caches import TokenCache
+import metrics
+
+load_dotenv()
+SECRET_KEY = os.getenv("SECRET_KEY")
+
+# Verified tokens, so hot clients skip signature checks and JSON decoding
+token_cache = TokenCache(maxsize=int(os.getenv("TOKEN_CACHE_SIZE", "10000")))
+metrics.register_cache("tokens", token_cache)
+
+
+def verify_token(token):
+    """Returns the token's claims, raising jwt.InvalidTokenError if it is invalid or expired."""
+    claims = token_cache.get(token)
+    if claims is None:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=["HS256"], options={"require": ["exp"]})
+        token_cache.put(token, claims)
+    return claims
+
+
+def require_auth(view):
+    """Route decorator: validates the bearer token and sets g.username / g.token_claims."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        header = request.headers.get("Authorization", "")
+        scheme, _, token = header.partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            return jsonify({'error': 'Missing bearer token'}), 401
+        try:
+            claims = verify_token(token.strip())
+        except jwt.InvalidTokenError:
+            return jsonify({'error': 'Invalid or expired token'}), 401
+        if not claims.get("username"):
+            return jsonify({'error': 'Invalid or expired token'}), 401
+        g.token_claims = claims
+        g.username = claims["username"]
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,125 @@
+# Stand-in rippled WebSocket server for the ledger stream.
+#
+# Answers subscribe and pushes what rippled pushes on a ledger close: a
+# ledgerClosed message carrying txn_count, then one validated transaction
+# message per transaction to every client on the transactions stream (and,
+# again, to clients subscribed to an account it touched). Ledgers close when
+# close_ledger() is called, or every --interval seconds from the command line.
+import hashlib
+import json
+import random
+import threading
+
+from websockets.exceptions import ConnectionClosed
+from websockets.sync.server import serve
+
+
+def payment(account, destination, drops=1000000):
+    """A validated Payment message body with the AccountRoot metadata rippled would attach."""
+    tx = {
+        "TransactionType": "Payment",
+        "Account": account,
+        "Destination": destination,
+        "Amount": str(drops),
+        "Fee": "12",
+    }
+    meta = {
+        "TransactionResult": "tesSUCCESS",
+        "AffectedNodes": [
+            {"ModifiedNode": {"LedgerEntryType": "AccountRoot", "FinalFields": {"Account": address}}}
+            for address in (account, destination)
+        ],
+    }
+    return tx, meta
+
+
+class FakeLedgerStream:
+    def __init__(self, ledger_index=1000):
+        self.ledger_index = ledger_index
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def handler(self, connection):
+        with self._lock:
+            self._clients[connection] = {"streams": set(), "accounts": set()}
+        try:
+            for raw in connection:
+                request = json.loads(raw)
+                if request.get("command") == "subscribe":
+                    with self._lock:
+                        subscription = self._clients[connection]
+                        subscription["streams"].update(request.get("streams") or [])
+                        subscription["accounts"].update(request.get("accounts") or [])
+                        ledger_index = self.ledger_index
+                    result = {"ledger_index": ledger_index} if request.get("streams") else {}
+                    response = {"result": result, "status": "success", "type": "response"}
+                else:
+                    response = {"error": "unknownCmd", "status": "error", "type": "response"}
+                if "id" in request:
+                    response["id"] = request["id"]
+                connection.send(json.dumps(response))
+        except ConnectionClosed:
+            pass
+        finally:
+            with self._lock:
+                self._clients.pop(connection, None)
+
+    def close_ledger(self, transactions=(), drop=0):
+        """
+        Closes a ledger holding transactions (a list of (tx, meta) pairs) and
+        streams it. The last `drop` transaction messages are not sent, as if
+        the connection lost them.
+        """
+        with self._lock:
+            self.ledger_index += 1
+            ledger_index = self.ledger_index
+            clients = list(self._clients.items())
+        closed = {"type": "ledgerClosed", "ledger_index": ledger_index, "txn_count": len(transactions),
+                  "ledger_hash": hashlib.sha256(str(ledger_index).encode()).hexdigest().upper()}
+        messages = []
+        for tx, meta in transactions[:len(transactions) - drop]:
+            tx_hash = hashlib.sha256(json.dumps([ledger_index, tx], sort_keys=True).encode()).hexdigest().upper()
+            message = {"type": "transaction", "validated": True, "ledger_index": ledger_index,
+                       "engine_result": meta["TransactionResult"], "hash": tx_hash, "tx_json": tx, "meta": meta}
+            touched = {node["ModifiedNode"]["FinalFields"]["Account"] for node in meta["AffectedNodes"]}
+            messages.append((json.dumps(message), touched))
+        for connection, subscription in clients:
+            try:
+                if "ledger" in subscription["streams"]:
+                    connection.send(json.dumps(closed))
+                for message, touched in messages:
+                    if "transactions" in subscription["streams"]:
+                        connection.send(message)
+                    if touched & subscription["accounts"]:
+                        connection.send(message)
+            except ConnectionClosed:
+                pass
+        return ledger_index
+
+
+def make_server(port=0, **options):
+    """Returns a websockets server with a FakeLedgerStream on .ledger; run serve_forever() in a thread."""
+    ledger = FakeLedgerStream(**options)
+    server = serve(ledger.handler, "127.0.0.1", port)
+    server.ledger = ledger
+    server.port = server.socket.getsockname()[1]
+    return server
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Fake rippled WebSocket ledger stream")
+    parser.add_argument("--port", type=int, default=6006)
+    parser.add_argument("--interval", type=float, default=4.0, help="seconds between ledger closes")
+    parser.add_argument("--accounts", type=int, default=100, help="synthetic accounts paying each other")
+    parser.add_argument("--txs", type=int, default=5, help="payments per ledger")
+    args = parser.parse_args()
+    accounts = [f"rFake{i:04d}" for i in range(args.accounts)]
+    server = make_server(args.port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"fake ledger stream on ws://127.0.0.1:{server.port}/")
+    while True:
+        time.sleep(args.interval)
+        server.ledger.close_ledger([payment(*random.sample(accounts, 2)) for _ in range(args.txs)])
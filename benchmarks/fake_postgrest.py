@@ -0,0 +1,202 @@
+# Stand-in PostgREST (Supabase REST) server for benchmarks.
+#
+# Serves the users and listings tables that supa.py / db.py use, from memory.
+# Supports what db.py sends: select projection, eq/neq/gt/gte/lt/lte/is/in
+# filters (with not.), multi-column order, limit, insert, upsert, update and
+# delete with return=representation. Rows get an updated_at on every write, as
+# the Supabase trigger the replica relies on would set.
+import datetime
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+RESERVED_PARAMS = ("select", "order", "limit", "offset", "columns", "on_conflict")
+
+
+class FakeTables:
+    def __init__(self):
+        self.tables = {"users": [], "listings": []}
+        self.next_id = {"users": 1, "listings": 1}
+        self._last_stamp = None
+        self._lock = threading.Lock()
+
+    def _stamp(self):
+        # Strictly increasing, like now() across separate transactions
+        stamp = datetime.datetime.now(datetime.timezone.utc)
+        if self._last_stamp is not None and stamp <= self._last_stamp:
+            stamp = self._last_stamp + datetime.timedelta(microseconds=1)
+        self._last_stamp = stamp
+        return stamp.isoformat()
+
+    def seed(self, table, rows):
+        with self._lock:
+            for row in rows:
+                self._insert(table, dict(row))
+
+    def _insert(self, table, row):
+        if "id" not in row:
+            row["id"] = self.next_id[table]
+        self.next_id[table] = max(self.next_id[table], row["id"] + 1)
+        row["updated_at"] = self._stamp()
+        self.tables[table].append(row)
+        return row
+
+    def select(self, table, params):
+        with self._lock:
+            rows = [row for row in self.tables[table] if _matches(row, params)]
+        order = dict(params).get("order")
+        if order:
+            # Stable sorts from the last key to the first give a multi-column order
+            for term in reversed(order.split(",")):
+                column, _, direction = term.partition(".")
+                rows.sort(key=lambda row: (row.get(column) is None, row.get(column)),
+                          reverse=direction.startswith("desc"))
+        limit = dict(params).get("limit")
+        if limit:
+            rows = rows[:int(limit)]
+        return [_project(row, dict(params).get("select")) for row in rows]
+
+    def insert(self, table, rows, upsert=False):
+        with self._lock:
+            result = []
+            for row in rows:
+                existing = next((r for r in self.tables[table] if upsert and r["id"] == row.get("id")), None)
+                if existing is not None:
+                    existing.update(row, updated_at=self._stamp())
+                    result.append(dict(existing))
+                else:
+                    result.append(dict(self._insert(table, dict(row))))
+            return result
+
+    def update(self, table, params, values):
+        with self._lock:
+            rows = [row for row in self.tables[table] if _matches(row, params)]
+            for row in rows:
+                row.update(values, updated_at=self._stamp())
+            return [dict(row) for row in rows]
+
+    def delete(self, table, params):
+        with self._lock:
+            rows = [row for row in self.tables[table] if _matches(row, params)]
+            self.tables[table] = [row for row in self.tables[table] if row not in rows]
+            return rows
+
+
+def _coerce(value, like):
+    if value == "null":
+        return None
+    if isinstance(like, bool):
+        return value == "true"
+    if isinstance(like, (int, float)):
+        return float(value)
+    return value
+
+
+def _matches(row, params):
+    for column, expression in params:
+        if column in RESERVED_PARAMS:
+            continue
+        negate = expression.startswith("not.")
+        if negate:
+            expression = expression[4:]
+        operator, _, raw = expression.partition(".")
+        current = row.get(column)
+        if operator == "in":
+            values = [v.strip('"') for v in raw.strip("()").split(",")]
+            ok = current is not None and str(current) in values
+        elif operator == "is":
+            ok = current is None if raw == "null" else current == (raw == "true")
+        else:
+            value = _coerce(raw, current)
+            if operator in ("eq", "neq"):
+                ok = (current == value or str(current) == raw) == (operator == "eq")
+            elif current is None or value is None:
+                ok = False
+            else:
+                ok = {
+                    "gt": current > value,
+                    "gte": current >= value,
+                    "lt": current < value,
+                    "lte": current <= value,
+                }[operator]
+        if ok == negate:
+            return False
+    return True
+
+
+def _project(row, select):
+    if not select or select == "*":
+        return dict(row)
+    return {column.strip(): row.get(column.strip()) for column in select.split(",")}
+
+
+def make_server(port=0, latency=0.0):
+    tables = FakeTables()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _route(self):
+            url = urlparse(self.path)
+            table = url.path.rstrip("/").rsplit("/", 1)[-1]
+            return table, parse_qsl(url.query, keep_blank_values=True)
+
+        def _body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length)) if length else None
+
+        def _reply(self, payload, status=200):
+            if latency:
+                time.sleep(latency)
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            table, params = self._route()
+            if table not in tables.tables:
+                return self._reply({"message": f"relation {table} does not exist"}, 404)
+            self._reply(tables.select(table, params))
+
+        def do_HEAD(self):
+            self.do_GET()
+
+        def do_POST(self):
+            table, params = self._route()
+            rows = self._body()
+            rows = rows if isinstance(rows, list) else [rows]
+            upsert = "merge-duplicates" in (self.headers.get("Prefer") or "")
+            self._reply(tables.insert(table, rows, upsert=upsert), 201)
+
+        def do_PATCH(self):
+            table, params = self._route()
+            self._reply(tables.update(table, params, self._body()))
+
+        def do_DELETE(self):
+            table, params = self._route()
+            self._body()  # postgrest-py sends a body with DELETE; drain it to keep the connection usable
+            self._reply(tables.delete(table, params))
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    server.tables = tables
+    return server
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fake Supabase PostgREST server")
+    parser.add_argument("--port", type=int, default=54321)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every call")
+    args = parser.parse_args()
+    print(f"fake PostgREST on http://127.0.0.1:{args.port}/rest/v1/")
+    make_server(args.port, args.latency).serve_forever()
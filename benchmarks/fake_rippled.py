@@ -0,0 +1,167 @@
+# Stand-in rippled JSON-RPC server for benchmarks.
+#
+# Answers the methods the backend uses (account_info, account_lines, account_tx,
+# submit, tx, ledger, fee, server_info) from synthetic in-memory data, with an
+# optional fixed latency per call to imitate network round trips.
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RIPPLE_EPOCH_OFFSET = 946684800
+
+
+class FakeLedger:
+    def __init__(self, lines_per_account=50, txs_per_account=500):
+        self.lines_per_account = lines_per_account
+        self.txs_per_account = txs_per_account
+        self.started = time.time()
+        self.submitted = {}
+        self._lock = threading.Lock()
+
+    def validated_index(self):
+        # A new ledger "closes" every 4 seconds
+        return 1000 + int((time.time() - self.started) / 4)
+
+    def handle(self, method, params):
+        handler = getattr(self, "_" + method, None)
+        if handler is None:
+            return {"error": "unknownCmd", "status": "error"}
+        return handler(params)
+
+    def _ledger(self, params):
+        return {"ledger_index": self.validated_index(), "validated": True}
+
+    def _server_info(self, params):
+        return {"info": {"build_version": "2.3.0", "network_id": 1}}
+
+    def _fee(self, params):
+        return {
+            "drops": {"base_fee": "10", "median_fee": "5000", "minimum_fee": "10", "open_ledger_fee": "10"},
+            "ledger_current_index": self.validated_index() + 1,
+        }
+
+    def _account_info(self, params):
+        account = params["account"]
+        balance = int(hashlib.sha256(account.encode()).hexdigest()[:8], 16)
+        return {
+            "account_data": {"Account": account, "Balance": str(balance), "Sequence": 1, "OwnerCount": 0},
+            "ledger_index": self.validated_index(),
+            "validated": True,
+        }
+
+    def _account_lines(self, params):
+        # Markers are {"ledger", "seq"} objects, as rippled returns; seq is our page offset
+        start = int((params.get("marker") or {}).get("seq", 0))
+        limit = min(params.get("limit") or 200, 400)
+        end = min(start + limit, self.lines_per_account)
+        lines = [
+            {
+                "account": f"rIssuer{i % 7}",
+                "currency": ("USD", "EUR", "ETH", "534F4C4F00000000000000000000000000000000")[i % 4],
+                "balance": str((i * 37) % 1000 / 10),
+                "limit": "1000",
+                "limit_peer": "0",
+            }
+            for i in range(start, end)
+        ]
+        result = {"account": params["account"], "lines": lines}
+        if end < self.lines_per_account:
+            result["marker"] = str(end)
+        return result
+
+    def _account_tx(self, params):
+        account = params["account"]
+        forward = params.get("forward", False)
+        # Markers are {"ledger", "seq"} objects, as rippled returns; seq is our page offset
+        start = int((params.get("marker") or {}).get("seq", 0))
+        limit = min(params.get("limit") or 200, 400)
+        low = params.get("ledger_index_min", -1)
+        positions = range(self.txs_per_account) if forward else range(self.txs_per_account - 1, -1, -1)
+        entries = [self._entry(account, i) for i in positions]
+        if low not in (-1, None):
+            entries = [entry for entry in entries if entry["ledger_index"] >= low]
+        page = entries[start:start + limit]
+        result = {"account": account, "transactions": page, "ledger_index_max": 1000, "ledger_index_min": 1}
+        if start + limit < len(entries):
+            result["marker"] = {"ledger": page[-1]["ledger_index"], "seq": start + limit}
+        return result
+
+    def _entry(self, account, i):
+        ledger_index = 1 + i * 2
+        return {
+            "hash": hashlib.sha256(f"{account}:{i}".encode()).hexdigest().upper(),
+            "ledger_index": ledger_index,
+            "close_time_iso": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(1700000000 + i * 60)),
+            "validated": True,
+            "meta": {"TransactionIndex": 0, "TransactionResult": "tesSUCCESS"},
+            "tx_json": {
+                "Account": account if i % 2 else "rCounterparty",
+                "Destination": "rCounterparty" if i % 2 else account,
+                "TransactionType": "Payment",
+                "Amount": str(1000 * i),
+                "Sequence": i + 1,
+                "date": 1700000000 + i * 60 - RIPPLE_EPOCH_OFFSET,
+            },
+        }
+
+    def _submit(self, params):
+        blob = params.get("tx_blob", "")
+        tx_hash = hashlib.sha512(bytes.fromhex("54584E00" + blob)).hexdigest()[:64].upper()
+        with self._lock:
+            self.submitted[tx_hash] = self.validated_index()
+        return {"engine_result": "tesSUCCESS", "engine_result_message": "applied", "tx_json": {"hash": tx_hash}}
+
+    def _tx(self, params):
+        with self._lock:
+            submitted_at = self.submitted.get(params["transaction"])
+        if submitted_at is None:
+            return {"error": "txnNotFound", "status": "error"}
+        validated = self.validated_index() > submitted_at
+        return {
+            "hash": params["transaction"],
+            "validated": validated,
+            "ledger_index": submitted_at + 1,
+            "meta": {"TransactionResult": "tesSUCCESS"},
+        }
+
+
+def make_server(port=0, latency=0.0, **ledger_options):
+    ledger = FakeLedger(**ledger_options)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            params = (body.get("params") or [{}])[0]
+            if latency:
+                time.sleep(latency)
+            result = ledger.handle(body["method"], params)
+            result.setdefault("status", "success")
+            payload = json.dumps({"result": result}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    server.ledger = ledger
+    return server
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fake rippled JSON-RPC server")
+    parser.add_argument("--port", type=int, default=5005)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every call")
+    args = parser.parse_args()
+    print(f"fake rippled on http://127.0.0.1:{args.port}/")
+    make_server(args.port, args.latency).serve_forever()
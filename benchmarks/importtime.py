@@ -0,0 +1,85 @@
+# Cold-start budget check for main:app.
+#
+# Imports the target module in fresh interpreters under `python -X importtime`,
+# takes the median cumulative import time, lists the slowest imports and exits
+# non-zero if the median is over budget or if a module that should load lazily
+# (supabase, numpy) was imported at startup.
+#
+#     python -m benchmarks.importtime
+#     python -m benchmarks.importtime --budget-ms 800 --runs 7 --top 30
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_BUDGET_MS = 1000
+# Only needed by specific routes, so they must not be imported by `import main`
+DEFAULT_LAZY_MODULES = ("supabase", "postgrest", "numpy", "cryptoconditions")
+
+
+def measure(module):
+    """Returns {module name: (self us, cumulative us)} for one cold import of module."""
+    env = dict(os.environ)
+    # A missing seed must not break the import; wallets are only derived when used
+    for i in range(1, 6):
+        env.pop(f"WALLET{i}_SEED", None)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        try:
+            self_us, cumulative_us = int(fields[0]), int(fields[1])
+        except ValueError:
+            continue  # header line
+        timings[fields[2].strip()] = (self_us, cumulative_us)
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the cold-start import time of main:app")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float,
+                        default=float(os.getenv("IMPORT_BUDGET_MS", DEFAULT_BUDGET_MS)))
+    parser.add_argument("--lazy", default=",".join(DEFAULT_LAZY_MODULES),
+                        help="comma-separated top-level packages that must not be imported at startup")
+    parser.add_argument("--top", type=int, default=15, help="number of slowest imports to list")
+    args = parser.parse_args(argv)
+
+    runs = [measure(args.module) for _ in range(args.runs)]
+    totals = [timings[args.module][1] / 1000 for timings in runs]
+    median_ms = statistics.median(totals)
+    last = runs[-1]
+
+    print(f"import {args.module}: median {median_ms:.1f} ms over {args.runs} runs "
+          f"(min {min(totals):.1f}, max {max(totals):.1f}), budget {args.budget_ms:.0f} ms")
+    print(f"\n{'cumulative ms':>14}{'self ms':>10}  module")
+    slowest = sorted(last.items(), key=lambda item: item[1][1], reverse=True)[:args.top]
+    for name, (self_us, cumulative_us) in slowest:
+        print(f"{cumulative_us / 1000:>14.1f}{self_us / 1000:>10.1f}  {name}")
+
+    failures = []
+    if median_ms > args.budget_ms:
+        failures.append(f"median {median_ms:.1f} ms is over the {args.budget_ms:.0f} ms budget")
+    lazy = [name for name in args.lazy.split(",") if name]
+    eager = sorted({name for name in last if name.split(".")[0] in lazy})
+    if eager:
+        failures.append("imported at startup but should load lazily: " + ", ".join(eager[:10]))
+    for failure in failures:
+        print(f"\nFAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
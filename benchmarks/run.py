@@ -0,0 +1,204 @@
+# Load-testing harness for main.py routes.
+#
+# Starts local stand-ins for rippled (fake_rippled) and Supabase (fake_postgrest),
+# points the app at them, serves main:app in-process and drives each endpoint at
+# a fixed concurrency, reporting p50/p95/p99 latency and requests/sec.
+#
+#     python -m benchmarks.run --concurrency 32 --requests 2000
+#     python -m benchmarks.run --endpoints get_balance,all_listings --rippled-latency 0.05
+import argparse
+import datetime
+import http.client
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks import fake_postgrest, fake_rippled
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def serve(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.server_address[1]
+
+
+def configure_environment(args, rippled_port, postgrest_port):
+    from xrpl.wallet import Wallet
+
+    os.environ["JSON_RPC_URL"] = f"http://127.0.0.1:{rippled_port}/"
+    os.environ["NEXT_PUBLIC_SUPABASE_URL"] = f"http://127.0.0.1:{postgrest_port}"
+    os.environ["NEXT_PUBLIC_SUPABASE_ANON_KEY"] = "benchmark-anon-key"
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-benchmark-secret-key")
+    os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    for i in range(1, 6):
+        os.environ.setdefault(f"WALLET{i}_SEED", Wallet.create().seed)
+
+
+def seed_tables(tables, args):
+    import bcrypt
+    from xrpl.wallet import Wallet
+
+    password = bcrypt.hashpw(b"benchmark", bcrypt.gensalt(args.bcrypt_rounds)).decode()
+    users = [
+        {"username": f"user{i}", "password": password, "wallet_id": Wallet.create().classic_address}
+        for i in range(args.users)
+    ]
+    tables.seed("users", users)
+    tables.seed("listings", [
+        {
+            "username": f"user{i % args.users}",
+            "seller_name": f"user{i % args.users}",
+            "listing_name": f"Listing {i} vintage item",
+            "listing_description": f"Description for listing {i}, a vintage guitar or bike",
+            "price": 1000 + i,
+            "buyer_name": None,
+            "escrow_condition": None,
+            "escrow_sequence": None,
+            "escrow_fufill": None,
+            "transaction_hash": None,
+        }
+        for i in range(args.listings)
+    ])
+    return users
+
+
+def build_endpoints(users, token):
+    address = users[0]["wallet_id"]
+    addresses = [user["wallet_id"] for user in users[:100]]
+    auth = {"Authorization": f"Bearer {token}"}
+    return {
+        "ping": ("GET", "/ping", None, {}),
+        "get_balance": ("GET", f"/xrp/get_balance?address={address}", None, {}),
+        "get_balances": ("POST", "/xrp/get_balances", {"addresses": addresses}, {}),
+        "get_trustlines": ("GET", f"/xrp/get_trustlines?address={address}", None, {}),
+        "summarize_trustlines": ("GET", f"/xrp/summarize_trustlines?address={address}", None, {}),
+        "history_ledger": ("GET", f"/xrp/get_transaction_history?address={address}&source=ledger", None, {}),
+        "history_index": ("GET", f"/xrp/get_transaction_history?address={address}&tx_type=Payment", None, {}),
+        "all_listings": ("GET", "/app/all_listings", None, {}),
+        "listings_page": ("GET", "/app/listings?limit=50&available=1", None, {}),
+        "search_listings": ("GET", "/app/search_listings?q=vintage+guitar", None, {}),
+        "login": ("POST", "/app/login", {"username": users[1]["username"], "password": "benchmark"}, {}),
+        "escrow_create": ("POST", "/escrow/create", {"id": 1, "cancel_after": 3600}, auth),
+    }
+
+
+def run_endpoint(port, method, path, body, headers, total, concurrency):
+    payload = json.dumps(body).encode() if body is not None else None
+    headers = {"Content-Type": "application/json", **headers}
+    latencies = []
+    errors = [0]
+    remaining = [total]
+    lock = threading.Lock()
+
+    def worker():
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    break
+                remaining[0] -= 1
+            started = time.perf_counter()
+            try:
+                connection.request(method, path, body=payload, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                failed = response.status >= 500
+            except Exception:
+                connection.close()
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+                failed = True
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                errors[0] += failed
+        connection.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "rps": len(latencies) / wall if wall else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark main.py routes against local stand-ins")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=500, help="requests per endpoint")
+    parser.add_argument("--endpoints", help="comma-separated subset of endpoint names")
+    parser.add_argument("--rippled-latency", type=float, default=0.0)
+    parser.add_argument("--supabase-latency", type=float, default=0.0)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--listings", type=int, default=1000)
+    parser.add_argument("--bcrypt-rounds", type=int, default=4)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    rippled = fake_rippled.make_server(latency=args.rippled_latency)
+    postgrest = fake_postgrest.make_server(latency=args.supabase_latency)
+    configure_environment(args, serve(rippled), serve(postgrest))
+    users = seed_tables(postgrest.tables, args)
+
+    # The app keeps local SQLite state in the working directory; keep it out of the repo
+    sys.path.insert(0, REPO_ROOT)
+    os.chdir(tempfile.mkdtemp(prefix="riverr-bench-"))
+
+    import jwt
+    from werkzeug.serving import make_server
+    import main as app_module
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, app_module.app, threaded=True)
+    port = serve(server)
+
+    token = jwt.encode(
+        {"username": users[0]["username"], "exp": datetime.datetime.utcnow() + datetime.timedelta(hours=1)},
+        os.environ["SECRET_KEY"],
+        algorithm="HS256",
+    )
+    endpoints = build_endpoints(users, token)
+    selected = args.endpoints.split(",") if args.endpoints else list(endpoints)
+
+    results = {}
+    for name in selected:
+        method, path, body, headers = endpoints[name]
+        results[name] = run_endpoint(port, method, path, body, headers, args.requests, args.concurrency)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'endpoint':<22}{'reqs':>7}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for name, result in results.items():
+            print(
+                f"{name:<22}{result['requests']:>7}{result['errors']:>8}{result['rps']:>10.1f}"
+                f"{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+            )
+    server.shutdown()
+    return results
+
+
+if __name__ == "__main__":
+    main()
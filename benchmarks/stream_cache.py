@@ -0,0 +1,102 @@
+# Checks the account cache against a streamed ledger.
+#
+# Runs a LedgerStream against fake_ledger_stream, wired to a LedgerCache the
+# same way start_ledger_stream wires the shared account cache, then closes
+# ledgers and checks that each one drops only the addresses it touched, and
+# drops everything when one of its transactions never arrives. Exits 1 on
+# any mismatch.
+#
+#     python -m benchmarks.stream_cache --addresses 500 --ledgers 20
+import argparse
+import queue
+import random
+import sys
+import threading
+
+from benchmarks import fake_ledger_stream
+from caches import LedgerCache
+from ledger_stream import LedgerStream, cache_listener
+
+
+def wait_for_ledger(events, ledger_index, timeout=5.0):
+    while True:
+        event = events.get(timeout=timeout)
+        if event["type"] == "ledger" and event["ledger_index"] >= ledger_index:
+            return event
+
+
+def cached(cache, addresses, ledger_index):
+    return {address for address in addresses if cache.get(address, ledger_index) is not None}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check ledger-stream driven account cache retention")
+    parser.add_argument("--addresses", type=int, default=500)
+    parser.add_argument("--ledgers", type=int, default=20)
+    parser.add_argument("--txs", type=int, default=10, help="payments per ledger")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    rng = random.Random(args.seed)
+
+    server = fake_ledger_stream.make_server()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    addresses = [f"rCached{i:05d}" for i in range(args.addresses)]
+
+    cache = LedgerCache(maxsize=args.addresses * 2)
+    events = queue.Queue()
+    stream = LedgerStream(f"ws://127.0.0.1:{server.port}/", reconnect_delay=0.5)
+    stream.add_listener(cache_listener(cache))
+    stream.add_listener(events.put)
+    # Watched accounts get their transactions twice (stream + account subscription)
+    stream.watch(addresses[:10])
+    stream.start()
+
+    failures = []
+    kept = dropped = 0
+    try:
+        ledger_index = wait_for_ledger(events, server.ledger.ledger_index)["ledger_index"]
+        for address in addresses:
+            cache.put(address, ledger_index, {"Account": address})
+
+        for _ in range(args.ledgers):
+            payments = [fake_ledger_stream.payment(*rng.sample(addresses, 2)) for _ in range(args.txs)]
+            touched = {tx[field] for tx, _ in payments for field in ("Account", "Destination")}
+            ledger_index = server.ledger.close_ledger(payments)
+            event = wait_for_ledger(events, ledger_index)
+            hits = cached(cache, addresses, ledger_index)
+            if event["changed"] != touched:
+                failures.append(f"ledger {ledger_index}: stream reported {len(event['changed'] or ())} "
+                                f"changed accounts, expected {len(touched)}")
+            if hits & touched:
+                failures.append(f"ledger {ledger_index}: served {len(hits & touched)} touched accounts")
+            if len(hits) != len(addresses) - len(touched):
+                failures.append(f"ledger {ledger_index}: kept {len(hits)} of "
+                                f"{len(addresses) - len(touched)} untouched accounts")
+            kept += len(hits)
+            dropped += len(touched)
+            # Refill what the ledger invalidated, as request traffic would
+            for address in touched:
+                cache.put(address, ledger_index, {"Account": address})
+
+        # A ledger with a lost transaction can't say what changed: the next one evicts everything
+        lost = server.ledger.close_ledger([fake_ledger_stream.payment(*rng.sample(addresses, 2))], drop=1)
+        ledger_index = server.ledger.close_ledger([fake_ledger_stream.payment(*rng.sample(addresses, 2))])
+        wait_for_ledger(events, ledger_index)
+        leftover = cached(cache, addresses, ledger_index) | cached(cache, addresses, lost)
+        if leftover:
+            failures.append(f"ledger {lost} never completed but {len(leftover)} entries survived")
+    except queue.Empty:
+        failures.append("timed out waiting for a ledger event")
+    finally:
+        stream.stop()
+        server.shutdown()
+
+    print(f"{args.ledgers} ledgers x {args.txs} payments over {args.addresses} cached accounts: "
+          f"{kept} entries carried forward, {dropped} dropped as touched")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LedgerCache:
+    """
+    Bounded LRU cache for ledger reads, keyed by (address, validated ledger index).
+
+    Entries are only valid for the ledger they were read at. When a newer
+    validated ledger is seen (via advance()), entries the ledger didn't touch
+    are carried forward if the caller knows what changed, and everything else
+    read at an older ledger is dropped, so a lookup never serves stale data.
+    """
+
+    def __init__(self, maxsize=4096, ledger_ttl=1.0):
+        self.maxsize = maxsize
+        self.ledger_ttl = ledger_ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._ledger_index = None
+        self._ledger_seen_at = 0.0
+        self._lock = threading.Lock()
+
+    def validated_ledger_index(self):
+        """Returns the last seen validated ledger index, or None if it is stale."""
+        with self._lock:
+            if self._ledger_index is None:
+                return None
+            if time.monotonic() - self._ledger_seen_at > self.ledger_ttl:
+                return None
+            return self._ledger_index
+
+    def advance(self, ledger_index, changed=None):
+        """
+        Records a newly validated ledger.
+
+        changed is the set of addresses that ledger touched, when known (the
+        ledger stream supplies it). If the ledger directly follows the current
+        one, entries for every other address are carried forward to it, since
+        their data is the same. Otherwise everything read at an older ledger
+        is dropped.
+        """
+        with self._lock:
+            self._ledger_seen_at = time.monotonic()
+            previous = self._ledger_index
+            if previous is not None and ledger_index <= previous:
+                return
+            self._ledger_index = ledger_index
+            carry = changed is not None and previous is not None and ledger_index == previous + 1
+            entries = OrderedDict()
+            for (address, index), value in self._entries.items():
+                if index >= ledger_index:
+                    entries[(address, index)] = value
+                elif carry and index == previous and address not in changed:
+                    entries.setdefault((address, ledger_index), value)
+            self._entries = entries
+
+    def get(self, address, ledger_index):
+        with self._lock:
+            key = (address, ledger_index)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, address, ledger_index, value):
+        with self._lock:
+            if self._ledger_index is not None and ledger_index < self._ledger_index:
+                return
+            key = (address, ledger_index)
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, address):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == address]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "ledger_index": self._ledger_index,
+            }
+
+
+class VersionedCache:
+    """
+    Small in-process read cache invalidated wholesale by writes.
+
+    Every write bumps the version and drops all entries. Readers take the
+    version before fetching and pass it to put(), so a fetch that raced a
+    write is never stored. Entries also expire after ttl seconds, which bounds
+    staleness from writes made by other processes.
+    """
+
+    def __init__(self, maxsize=256, ttl=30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, key, value, version):
+        with self._lock:
+            if version != self.version:
+                return
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_or_load(self, key, load):
+        value = self.get(key)
+        if value is None:
+            version = self.version
+            value = load()
+            self.put(key, value, version)
+        return value
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "version": self.version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class TokenCache:
+    """
+    Bounded LRU of already-verified bearer tokens and their claims.
+
+    Entries carry the token's own exp claim and are dropped once it passes,
+    so a cached token is never accepted after it has expired.
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None:
+                if entry[0] > time.time():
+                    self._entries.move_to_end(token)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[token]
+            self.misses += 1
+            return None
+
+    def put(self, token, claims):
+        expires_at = claims.get("exp")
+        if expires_at is None:
+            return
+        with self._lock:
+            self._entries[token] = (float(expires_at), claims)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
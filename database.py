@@ -1,16 +1,125 @@
 from xrpl.wallet import generate_faucet_wallet
-from xrpl.clients import JsonRpcClient
+from xrpl.models.requests import AccountTx
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+import json
+import os
+import queue
+import re
 import sqlite3
-import bcrypt
+import threading
+import passwords
+import xrpl_registry
 
-client = JsonRpcClient("https://s.altnet.rippletest.net:51234")
+DATABASE_PATH = os.getenv("SQLITE_PATH", "users.db")
+
+# Applied to every connection. WAL lets readers run alongside the single writer,
+# and synchronous=NORMAL is durable across application crashes in WAL mode.
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",  # KiB, i.e. 16 MB of page cache per connection
+)
+STATEMENT_CACHE_SIZE = 256
+# Idle connections kept for reuse; more are opened under load and closed when returned to a full pool
+POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "8"))
+
+_local = threading.local()
+_pool = queue.LifoQueue(maxsize=POOL_SIZE)
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+def _connect():
+    # check_same_thread is off so pooled connections can move between threads;
+    # each is only ever held by one thread at a time
+    conn = sqlite3.connect(
+        DATABASE_PATH,
+        timeout=5.0,
+        isolation_level=None,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        check_same_thread=False,
+    )
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    _ensure_schema(conn)
+    return conn
+
+def get_connection():
+    """
+    Returns the connection held by this thread, taking one from the pool on first use.
+
+    The thread keeps it until release_connection(). Flask releases it when the
+    app context is torn down, so werkzeug's thread-per-request server reuses
+    pooled connections (and their prepared-statement caches) across requests;
+    long-lived executor threads simply hold theirs. Connections run in
+    autocommit mode; group writes with transaction().
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        try:
+            conn = _pool.get_nowait()
+        except queue.Empty:
+            conn = _connect()
+        _local.conn = conn
+    return conn
+
+def release_connection():
+    """Returns this thread's connection to the pool, or closes it if the pool is full."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        return
+    _local.conn = None
+    if conn.in_transaction:
+        conn.execute("ROLLBACK")
+    try:
+        _pool.put_nowait(conn)
+    except queue.Full:
+        conn.close()
+
+def close_connection():
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+@contextmanager
+def transaction():
+    """
+    Runs the block as one write transaction on this thread's connection.
+
+    BEGIN IMMEDIATE takes the write lock up front, so a transaction never fails
+    halfway with SQLITE_BUSY on lock upgrade. Nested scopes join the outer one.
+    """
+    conn = get_connection()
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
 
 def initialize_database():
-    conn = sqlite3.connect("users.db")
-    cursor = conn.cursor()
+    _create_schema(get_connection())
 
-    # Users table
-    cursor.execute("""
+def _ensure_schema(conn):
+    # Creates the tables once per process, on the first connection opened
+    global _schema_ready
+    with _schema_lock:
+        if not _schema_ready:
+            _create_schema(conn)
+            _schema_ready = True
+
+def _create_schema(conn):
+    conn.executescript("""
+        -- Users table
         CREATE TABLE IF NOT EXISTS users (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             full_name TEXT NOT NULL,
@@ -19,11 +128,9 @@ def initialize_database():
             address TEXT NOT NULL,
             secret TEXT NOT NULL,
             funded INTEGER DEFAULT 1
-        )
-    """)
+        );
 
-    # Trustlines table
-    cursor.execute("""
+        -- Trustlines table
         CREATE TABLE IF NOT EXISTS trustlines (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             user_id INTEGER NOT NULL,
@@ -34,66 +141,147 @@ def initialize_database():
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY(user_id) REFERENCES users(id)
-        )
-    """)
+        );
+
+        -- Tracked accounts for the local transaction-history index
+        CREATE TABLE IF NOT EXISTS tracked_accounts (
+            address TEXT PRIMARY KEY,
+            high_water_ledger INTEGER NOT NULL DEFAULT 0,  -- last fully synced validated ledger
+            synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
 
+        -- Transactions per tracked account, as returned by account_tx
+        CREATE TABLE IF NOT EXISTS account_transactions (
+            address TEXT NOT NULL,
+            hash TEXT NOT NULL,
+            ledger_index INTEGER NOT NULL,
+            tx_index INTEGER NOT NULL DEFAULT 0,  -- position within the ledger
+            tx_type TEXT,
+            counterparty TEXT,
+            close_time INTEGER,  -- unix seconds
+            data TEXT NOT NULL,  -- raw account_tx entry as JSON
+            PRIMARY KEY (address, hash)
+        );
+        CREATE INDEX IF NOT EXISTS idx_account_tx_order
+        ON account_transactions (address, ledger_index DESC, tx_index DESC);
+        CREATE INDEX IF NOT EXISTS idx_account_tx_type
+        ON account_transactions (address, tx_type, ledger_index DESC);
+        CREATE INDEX IF NOT EXISTS idx_account_tx_counterparty
+        ON account_transactions (address, counterparty, ledger_index DESC);
+        CREATE INDEX IF NOT EXISTS idx_account_tx_time
+        ON account_transactions (address, close_time);
+
+        -- Full-text index over listings (rowid = listing id), kept in sync by db.py writes
+        CREATE VIRTUAL TABLE IF NOT EXISTS listing_search USING fts5(
+            listing_name,
+            listing_description,
+            price UNINDEXED,
+            tokenize = 'porter unicode61',
+            prefix = '2 3'
+        );
+        -- One row once listing_search has been built from Supabase, even if there were no listings
+        CREATE TABLE IF NOT EXISTS listing_search_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            built_at TEXT NOT NULL
+        );
+
+        -- Submission queue jobs (see submission_queue.py), shared by every worker process
+        CREATE TABLE IF NOT EXISTS submission_jobs (
+            id TEXT PRIMARY KEY,
+            owner TEXT,
+            status TEXT NOT NULL,  -- queued, submitted, validated, failed or expired
+            hash TEXT NOT NULL,
+            last_ledger_sequence INTEGER,
+            engine_result TEXT,
+            result TEXT,
+            error TEXT,
+            ledger_index INTEGER,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_submission_jobs_created
+        ON submission_jobs (created_at);
 
-    conn.commit()
-    conn.close()
+        -- Local replica of the Supabase users / listings tables (see replica.py)
+        CREATE TABLE IF NOT EXISTS replica_users (
+            username TEXT PRIMARY KEY,
+            wallet_id TEXT,
+            updated_at TEXT,
+            data TEXT NOT NULL  -- full Supabase row as JSON
+        );
+        CREATE TABLE IF NOT EXISTS replica_listings (
+            id INTEGER PRIMARY KEY,
+            seller_name TEXT,
+            buyer_name TEXT,
+            price REAL,
+            updated_at TEXT,
+            data TEXT NOT NULL  -- full Supabase row as JSON
+        );
+        CREATE INDEX IF NOT EXISTS idx_replica_listings_seller
+        ON replica_listings (seller_name, id);
+        CREATE INDEX IF NOT EXISTS idx_replica_users_wallet
+        ON replica_users (wallet_id);
+        CREATE TABLE IF NOT EXISTS replica_state (
+            table_name TEXT PRIMARY KEY,
+            updated_at TEXT,  -- change-polling watermark: last (updated_at, key) applied
+            last_key TEXT,  -- JSON, so integer and text keys keep their type
+            synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
 
 def insert_user(full_name, username, password, address, secret):
-    conn = sqlite3.connect("users.db")
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO users (full_name, username, password, address, secret, funded)
-        VALUES (?, ?, ?, ?, ?, 1)
-    """, (full_name, username, password, address, secret))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute("""
+            INSERT INTO users (full_name, username, password, address, secret, funded)
+            VALUES (?, ?, ?, ?, ?, 1)
+        """, (full_name, username, password, address, secret))
 
 def user_exists(username):
-    conn = sqlite3.connect("users.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT id FROM users WHERE username = ?", (username,))
-    result = cursor.fetchone()
-    conn.close()
-    return result is not None
+    row = get_connection().execute("SELECT 1 FROM users WHERE username = ?", (username,)).fetchone()
+    return row is not None
 
 
 def create_and_store_user(full_name, username, hashed_password):
     if user_exists(username):
         raise Exception("User already exists")
 
-    wallet = generate_faucet_wallet(client, debug=True)
+    # Funding goes over the network, so it happens before the write lock is taken
+    wallet = generate_faucet_wallet(xrpl_registry.get_client(), debug=True)
 
-    insert_user(
-        full_name,
-        username,
-        hashed_password,
-        wallet.classic_address,
-        wallet.seed
-    )
+    # The existence check and insert are one transaction, so a concurrent signup can't slip in between
+    with transaction():
+        if user_exists(username):
+            raise Exception("User already exists")
+        insert_user(
+            full_name,
+            username,
+            hashed_password,
+            wallet.classic_address,
+            wallet.seed
+        )
 
     return wallet.classic_address, wallet.seed
 
 def validate_user_login(username, password):
-    conn = sqlite3.connect("users.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT password FROM users WHERE username = ?", (username,))
-    result = cursor.fetchone()
-    conn.close()
+    conn = get_connection()
+    result = conn.execute("SELECT password FROM users WHERE username = ?", (username,)).fetchone()
 
     if result:
         stored_hashed_pw = result[0]
-        return bcrypt.checkpw(password.encode(), stored_hashed_pw)
+        if not passwords.check_password(password, stored_hashed_pw):
+            return False
+        if passwords.needs_rehash(stored_hashed_pw):
+            new_hash = passwords.hash_password(password)
+            with transaction() as conn:
+                conn.execute("UPDATE users SET password = ? WHERE username = ? AND password = ?",
+                             (new_hash, username, stored_hashed_pw))
+        return True
     return False
 
 def get_user_data_by_username(username):
-    conn = sqlite3.connect("users.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT full_name, address, secret FROM users WHERE username = ?", (username,))
-    row = cursor.fetchone()
-    conn.close()
+    row = get_connection().execute(
+        "SELECT full_name, address, secret FROM users WHERE username = ?", (username,)
+    ).fetchone()
 
     if row:
         return {
@@ -105,35 +293,430 @@ def get_user_data_by_username(username):
         raise ValueError("User not found.")
     
 def get_all_usernames(exclude_username=None):
-    conn = sqlite3.connect("users.db")
-    cursor = conn.cursor()
+    conn = get_connection()
     if exclude_username:
-        cursor.execute("SELECT username FROM users WHERE username != ?", (exclude_username,))
+        rows = conn.execute("SELECT username FROM users WHERE username != ?", (exclude_username,)).fetchall()
     else:
-        cursor.execute("SELECT username FROM users")
-    rows = cursor.fetchall()
-    conn.close()
+        rows = conn.execute("SELECT username FROM users").fetchall()
     return [row[0] for row in rows]
 
 
 def insert_trustline(username, currency, issuer_address, trust_limit):
-    conn = sqlite3.connect("users.db")
-    cursor = conn.cursor()
+    # User lookup and insert in one statement, inside one transaction
+    with transaction() as conn:
+        cursor = conn.execute("""
+            INSERT INTO trustlines (user_id, currency, issuer_address, trust_limit)
+            SELECT id, ?, ?, ? FROM users WHERE username = ?
+        """, (currency, issuer_address, trust_limit, username))
+        if cursor.rowcount == 0:
+            raise ValueError("User not found")
 
-    # Get user_id from username
-    cursor.execute("SELECT id FROM users WHERE username = ?", (username,))
-    result = cursor.fetchone()
-    if not result:
-        conn.close()
-        raise ValueError("User not found")
-    
-    user_id = result[0]
 
-    cursor.execute("""
-        INSERT INTO trustlines (user_id, currency, issuer_address, trust_limit)
-        VALUES (?, ?, ?, ?)
-    """, (user_id, currency, issuer_address, trust_limit))
+# --- Local transaction-history index ---
+
+RIPPLE_EPOCH_OFFSET = 946684800  # seconds between 1970-01-01 and 2000-01-01
+
+def _transaction_row(address, entry):
+    # account_tx entries are {tx_json, meta, hash, ledger_index, ...} in API v2
+    # and {tx, meta, ...} in API v1
+    tx = entry.get("tx_json") or entry.get("tx") or {}
+    meta = entry.get("meta") or {}
+
+    if tx.get("Account") != address:
+        counterparty = tx.get("Account")
+    else:
+        limit_amount = tx.get("LimitAmount")
+        counterparty = (
+            tx.get("Destination")
+            or tx.get("Owner")
+            or (limit_amount.get("issuer") if isinstance(limit_amount, dict) else None)
+        )
+
+    if entry.get("close_time_iso"):
+        close_time = int(datetime.fromisoformat(entry["close_time_iso"].replace("Z", "+00:00")).timestamp())
+    elif tx.get("date") is not None:
+        close_time = tx["date"] + RIPPLE_EPOCH_OFFSET
+    else:
+        close_time = None
+
+    return (
+        address,
+        entry.get("hash") or tx.get("hash"),
+        entry.get("ledger_index") or tx.get("ledger_index"),
+        meta.get("TransactionIndex", 0) if isinstance(meta, dict) else 0,
+        tx.get("TransactionType"),
+        counterparty,
+        close_time,
+        json.dumps(entry),
+    )
+
+# Pages of a new account's history synced inside a request; the rest is backfilled in the background
+HISTORY_SYNC_PAGES = int(os.getenv("HISTORY_SYNC_PAGES", "5"))
+_backfill_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="history-backfill")
+_backfilling = set()
+_backfill_lock = threading.Lock()
+
+def sync_transaction_history(address, page_size=400, max_pages=None):
+    """
+    Pulls every validated transaction after the account's high-water mark into
+    the local index, oldest first, and advances the mark.
+
+    With max_pages (request threads), the sync stops after that many pages and
+    the rest of the backfill continues in the background. While a background
+    backfill runs for the address this returns straight away, and callers serve
+    whatever has been indexed so far.
+
+    Returns:
+        int: Number of transactions fetched by this call.
+    """
+    with _backfill_lock:
+        if address in _backfilling:
+            return 0
+    fetched, complete = _sync_history_pages(address, page_size, max_pages)
+    if not complete:
+        _start_backfill(address, page_size)
+    return fetched
+
+def _start_backfill(address, page_size):
+    with _backfill_lock:
+        if address in _backfilling:
+            return
+        _backfilling.add(address)
+
+    def backfill():
+        try:
+            _sync_history_pages(address, page_size)
+        except Exception as e:
+            print(f"Transaction history backfill for {address} failed: {e}")
+        finally:
+            with _backfill_lock:
+                _backfilling.discard(address)
+
+    _backfill_executor.submit(backfill)
+
+def _sync_history_pages(address, page_size, max_pages=None):
+    # Returns (transactions fetched, whether the index reached the latest validated ledger)
+    row = get_connection().execute(
+        "SELECT high_water_ledger FROM tracked_accounts WHERE address = ?", (address,)
+    ).fetchone()
+    if row is None:
+        with transaction() as conn:
+            conn.execute("INSERT OR IGNORE INTO tracked_accounts (address) VALUES (?)", (address,))
+    high_water = row[0] if row else 0
+
+    fetched = 0
+    pages = 0
+    marker = None
+    while True:
+        response = xrpl_registry.get_client().request(AccountTx(
+            account=address,
+            ledger_index_min=high_water + 1 if high_water else -1,
+            ledger_index_max=-1,
+            limit=page_size,
+            binary=False,
+            forward=True,
+            marker=marker,
+        ))
+        result = response.result
+        if not response.is_successful():
+            # Nothing has validated past the mark yet
+            if result.get("error") in ("lgrIdxsInvalid", "lgrIdxMalformed"):
+                return fetched, True
+            raise Exception(result.get("error_message") or result.get("error"))
+
+        rows = [_transaction_row(address, entry) for entry in result.get("transactions", [])]
+        marker = result.get("marker")
+        if marker:
+            # The last ledger of a page may be split across pages; re-reading it is harmless
+            mark = max(high_water, max((row[2] for row in rows), default=high_water) - 1)
+        else:
+            mark = max(high_water, result.get("ledger_index_max", high_water))
+
+        # Each page and its high-water mark commit together; no lock is held across requests
+        with transaction() as conn:
+            conn.executemany("""
+                INSERT OR IGNORE INTO account_transactions
+                    (address, hash, ledger_index, tx_index, tx_type, counterparty, close_time, data)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            # MAX: a request sync and the stream refresh can overlap; the mark never moves back
+            conn.execute("""
+                UPDATE tracked_accounts
+                SET high_water_ledger = MAX(high_water_ledger, ?), synced_at = CURRENT_TIMESTAMP
+                WHERE address = ?
+            """, (mark, address))
+        fetched += len(rows)
+        pages += 1
+        if not marker:
+            return fetched, True
+        if max_pages and pages >= max_pages:
+            return fetched, False
+
+def query_transaction_history(address, start=None, end=None, tx_type=None, counterparty=None,
+                              limit=10, before=None):
+    """
+    Answers a history query from the local index, newest first.
+
+    Args:
+        start, end (int): Optional unix-time bounds on the ledger close time (inclusive).
+        tx_type (str): Optional TransactionType, e.g. "Payment".
+        counterparty (str): Optional address on the other side of the transaction.
+        before (tuple): Optional (ledger_index, tx_index) keyset position to continue from.
 
-    conn.commit()
-    conn.close()
-    
\ No newline at end of file
+    Returns:
+        tuple[list, tuple]: Raw account_tx entries and the keyset position of the
+        next page (None when there are no more rows).
+    """
+    clauses = ["address = ?"]
+    params = [address]
+    if start is not None:
+        clauses.append("close_time >= ?")
+        params.append(start)
+    if end is not None:
+        clauses.append("close_time <= ?")
+        params.append(end)
+    if tx_type:
+        clauses.append("tx_type = ?")
+        params.append(tx_type)
+    if counterparty:
+        clauses.append("counterparty = ?")
+        params.append(counterparty)
+    if before:
+        clauses.append("(ledger_index < ? OR (ledger_index = ? AND tx_index < ?))")
+        params.extend([before[0], before[0], before[1]])
+    params.append(limit)
+
+    rows = get_connection().execute(f"""
+        SELECT ledger_index, tx_index, data FROM account_transactions
+        WHERE {" AND ".join(clauses)}
+        ORDER BY ledger_index DESC, tx_index DESC
+        LIMIT ?
+    """, params).fetchall()
+
+    entries = [json.loads(row[2]) for row in rows]
+    next_before = (rows[-1][0], rows[-1][1]) if len(rows) == limit else None
+    return entries, next_before
+
+
+# --- Listing full-text search ---
+
+def index_listing(listing_id, listing_name, listing_description, price):
+    with transaction() as conn:
+        conn.execute("DELETE FROM listing_search WHERE rowid = ?", (listing_id,))
+        conn.execute("""
+            INSERT INTO listing_search (rowid, listing_name, listing_description, price)
+            VALUES (?, ?, ?, ?)
+        """, (listing_id, listing_name or "", listing_description or "", price))
+
+def unindex_listing(listing_id):
+    with transaction() as conn:
+        conn.execute("DELETE FROM listing_search WHERE rowid = ?", (listing_id,))
+
+def rebuild_listing_index(listings):
+    with transaction() as conn:
+        conn.execute("DELETE FROM listing_search")
+        conn.executemany("""
+            INSERT INTO listing_search (rowid, listing_name, listing_description, price)
+            VALUES (?, ?, ?, ?)
+        """, [
+            (row["id"], row.get("listing_name") or "", row.get("listing_description") or "", row.get("price"))
+            for row in listings
+        ])
+        conn.execute("INSERT OR REPLACE INTO listing_search_state (id, built_at) VALUES (1, CURRENT_TIMESTAMP)")
+
+def listing_index_built():
+    return get_connection().execute("SELECT 1 FROM listing_search_state LIMIT 1").fetchone() is not None
+
+def clear_listing_index_built():
+    # Forces the next search to rebuild the index, e.g. after an incremental update failed
+    get_connection().execute("DELETE FROM listing_search_state")
+
+def _match_expression(query):
+    # Quote every term so user input can't produce FTS syntax errors; prefix-match the last one
+    terms = re.findall(r"\w+", query)
+    if not terms:
+        return None
+    quoted = ['"' + term + '"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+# bm25 scores every row a term matches, so ranking is limited to the newest matches
+SEARCH_CANDIDATES = 2000
+
+def search_listings(query, limit=20, offset=0):
+    """
+    Ranked full-text search over listing names and descriptions (names weigh more).
+
+    Only the SEARCH_CANDIDATES most recent matches (highest listing ids) are
+    ranked, which keeps broad terms cheap on a large catalog; offset can't
+    reach past them.
+
+    Returns:
+        list[dict]: id, listing_name, listing_description, price and score (lower is better).
+    """
+    if offset >= SEARCH_CANDIDATES:
+        raise ValueError(f"offset must be below {SEARCH_CANDIDATES}")
+    match = _match_expression(query)
+    if match is None:
+        return []
+    limit = min(limit, SEARCH_CANDIDATES - offset)
+    rows = get_connection().execute("""
+        SELECT rowid, listing_name, listing_description, price, bm25(listing_search, 5.0, 1.0) AS score
+        FROM listing_search
+        WHERE listing_search MATCH ?
+          AND rowid >= coalesce((
+              SELECT rowid FROM listing_search WHERE listing_search MATCH ?
+              ORDER BY rowid DESC LIMIT 1 OFFSET ?
+          ), 0)
+        ORDER BY score
+        LIMIT ? OFFSET ?
+    """, (match, match, SEARCH_CANDIDATES - 1, limit, offset)).fetchall()
+    return [
+        {"id": row[0], "listing_name": row[1], "listing_description": row[2], "price": row[3], "score": row[4]}
+        for row in rows
+    ]
+
+
+# --- Local replica of Supabase users / listings ---
+
+# Primary key and indexed columns of each replicated table; everything else lives in data
+REPLICA_TABLES = {
+    "users": ("username", ("wallet_id",)),
+    "listings": ("id", ("seller_name", "buyer_name", "price")),
+}
+
+def _replica_row(table, row):
+    key, columns = REPLICA_TABLES[table]
+    return (row[key],) + tuple(row.get(column) for column in columns) + (row.get("updated_at"), json.dumps(row))
+
+def _upsert_replica_rows(conn, table, rows):
+    key, columns = REPLICA_TABLES[table]
+    names = (key,) + columns + ("updated_at", "data")
+    conn.executemany(
+        f"INSERT OR REPLACE INTO replica_{table} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})",
+        [_replica_row(table, row) for row in rows],
+    )
+
+def replica_upsert(table, rows):
+    with transaction() as conn:
+        _upsert_replica_rows(conn, table, rows)
+
+def replica_delete(table, keys):
+    key, _ = REPLICA_TABLES[table]
+    with transaction() as conn:
+        conn.executemany(f"DELETE FROM replica_{table} WHERE {key} = ?", [(k,) for k in keys])
+
+def replica_replace(table, rows, updated_at, last_key):
+    # Full resync: swaps the table contents and resets the watermark atomically
+    with transaction() as conn:
+        conn.execute(f"DELETE FROM replica_{table}")
+        _upsert_replica_rows(conn, table, rows)
+        _set_replica_watermark(conn, table, updated_at, last_key)
+
+def replica_apply_changes(table, rows, updated_at, last_key):
+    with transaction() as conn:
+        _upsert_replica_rows(conn, table, rows)
+        _set_replica_watermark(conn, table, updated_at, last_key)
+
+def _set_replica_watermark(conn, table, updated_at, last_key):
+    conn.execute("""
+        INSERT OR REPLACE INTO replica_state (table_name, updated_at, last_key, synced_at)
+        VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+    """, (table, updated_at, json.dumps(last_key)))
+
+def replica_watermark(table):
+    """Returns (updated_at, last_key) of the last applied change, or None before the first sync."""
+    row = get_connection().execute(
+        "SELECT updated_at, last_key FROM replica_state WHERE table_name = ?", (table,)
+    ).fetchone()
+    return (row[0], json.loads(row[1])) if row else None
+
+def _replica_rows(sql, params=()):
+    return [json.loads(row[0]) for row in get_connection().execute(sql, params).fetchall()]
+
+def replica_get_user(username):
+    rows = _replica_rows("SELECT data FROM replica_users WHERE username = ?", (username,))
+    return rows[0] if rows else None
+
+def replica_get_users(usernames):
+    usernames = list(usernames)
+    if not usernames:
+        return []
+    placeholders = ", ".join("?" * len(usernames))
+    return _replica_rows(f"SELECT data FROM replica_users WHERE username IN ({placeholders})", usernames)
+
+def replica_usernames(exclude_username=None):
+    conn = get_connection()
+    if exclude_username:
+        rows = conn.execute("SELECT username FROM replica_users WHERE username != ?", (exclude_username,)).fetchall()
+    else:
+        rows = conn.execute("SELECT username FROM replica_users").fetchall()
+    return [row[0] for row in rows]
+
+def replica_wallet_ids():
+    rows = get_connection().execute("SELECT wallet_id FROM replica_users WHERE wallet_id IS NOT NULL").fetchall()
+    return [row[0] for row in rows]
+
+def replica_wallet_exists(wallet_id):
+    row = get_connection().execute(
+        "SELECT 1 FROM replica_users WHERE wallet_id = ? LIMIT 1", (wallet_id,)
+    ).fetchone()
+    return row is not None
+
+def replica_get_listing(listing_id):
+    rows = _replica_rows("SELECT data FROM replica_listings WHERE id = ?", (listing_id,))
+    return rows[0] if rows else None
+
+def replica_listings(after_id=None, limit=None, seller=None, available=False, min_price=None, max_price=None):
+    clauses = []
+    params = []
+    if after_id is not None:
+        clauses.append("id > ?")
+        params.append(after_id)
+    if seller:
+        clauses.append("seller_name = ?")
+        params.append(seller)
+    if available:
+        clauses.append("buyer_name IS NULL")
+    if min_price is not None:
+        clauses.append("price >= ?")
+        params.append(min_price)
+    if max_price is not None:
+        clauses.append("price <= ?")
+        params.append(max_price)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    if limit is not None:
+        params.append(limit)
+    return _replica_rows(
+        f"SELECT data FROM replica_listings {where} ORDER BY id{' LIMIT ?' if limit is not None else ''}", params
+    )
+
+# --- Submission queue jobs ---
+
+JOB_FIELDS = ("id", "owner", "status", "hash", "last_ledger_sequence", "engine_result", "result", "error",
+              "ledger_index", "created_at", "updated_at")
+
+def insert_job(job):
+    get_connection().execute(
+        f"INSERT INTO submission_jobs ({', '.join(JOB_FIELDS)}) VALUES ({', '.join('?' * len(JOB_FIELDS))})",
+        [job.get(field) for field in JOB_FIELDS],
+    )
+
+def update_job(job_id, **fields):
+    columns = ", ".join(f"{field} = ?" for field in fields)
+    get_connection().execute(
+        f"UPDATE submission_jobs SET {columns} WHERE id = ?", [*fields.values(), job_id]
+    )
+
+def get_job(job_id):
+    row = get_connection().execute(
+        f"SELECT {', '.join(JOB_FIELDS)} FROM submission_jobs WHERE id = ?", (job_id,)
+    ).fetchone()
+    return dict(zip(JOB_FIELDS, row)) if row else None
+
+def prune_jobs(created_before, statuses):
+    # Finished jobs past retention; unfinished ones are kept whatever their age
+    get_connection().execute(
+        f"DELETE FROM submission_jobs WHERE created_at < ? AND status IN ({', '.join('?' * len(statuses))})",
+        [created_before, *statuses],
+    )
@@ -1,9 +1,34 @@
-from supa import db
-import bcrypt
+import supa
+from caches import VersionedCache
+import database
+import metrics
+import passwords
+import replica
+import os
+
+# Listing columns that may be sent to clients (escrow_fufill stays server-side).
+# username and seller_name are separate columns, not aliases: create_listing writes username,
+# while the escrow routes and the seller filter read seller_name, so clients get both.
+LISTING_PUBLIC_FIELDS = (
+    "id", "username", "seller_name", "listing_name", "price", "listing_description",
+    "buyer_name", "escrow_condition", "escrow_sequence", "transaction_hash",
+)
+
+# Listing reads are served from here until a listing write invalidates it
+listing_cache = VersionedCache(
+    maxsize=int(os.getenv("LISTING_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("LISTING_CACHE_TTL", "30")),
+)
+metrics.register_cache("listings", listing_cache)
+
+# User columns needed by the escrow flows
+USER_FIELDS = "username, wallet_id"
 
 # utils
 def user_exists(username):
-    response = db.table("users").select("*").eq("username", username).execute()
+    if replica.active_replica():
+        return database.replica_get_user(username) is not None
+    response = supa.db.table("users").select("username").eq("username", username).limit(1).execute()
     if response.data==[]:
         return False
     else:
@@ -11,22 +36,32 @@ def user_exists(username):
 
 # user methods
 def validate_user_login(username, password):
-    response = db.table("users").select("*").eq("username", username).execute()
+    response = supa.db.table("users").select("password").eq("username", username).execute()
     if response.data:
-        stored_hashed_pw =response.data[0]["password"].encode('utf-8')
-        return bcrypt.checkpw(password.encode('utf-8'), stored_hashed_pw)
+        stored_hashed_pw = response.data[0]["password"]
+        if not passwords.check_password(password, stored_hashed_pw):
+            return False
+        # Move the stored hash to the current work factor while we have the plaintext
+        if passwords.needs_rehash(stored_hashed_pw):
+            new_hash = passwords.hash_password(password)
+            response = supa.db.table("users").update({"password": new_hash}).eq("username", username).execute()
+            _sync_replica("users", response.data)
+        return True
     return False
 
 def insert_user(username, password): 
     data = {
         "username": username,
-        "password": bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        "password": passwords.hash_password(password)
     }
-    response = db.table("users").insert(data).execute()
+    response = supa.db.table("users").insert(data).execute()
+    _sync_replica("users", response.data)
     return response.data
 
 def get_user_data_by_username(username):
-    response = db.table("users").select("*").eq("username", username).execute()
+    if replica.active_replica():
+        return database.replica_get_user(username) or False
+    response = supa.db.table("users").select("*").eq("username", username).execute()
 
     if response.data==[]:
         return False
@@ -34,14 +69,77 @@ def get_user_data_by_username(username):
         return response.data[0]
     
 def get_all_usernames(exclude_username=None):
+    if replica.active_replica():
+        return database.replica_usernames(exclude_username)
     if exclude_username:
-        response = db.table("users").select("username").neq("username", exclude_username).execute()
+        response = supa.db.table("users").select("username").neq("username", exclude_username).execute()
     else:
-        response = db.table("users").select("username").execute()
+        response = supa.db.table("users").select("username").execute()
     return [row["username"] for row in response.data]
 
+def get_users_by_usernames(usernames, columns=USER_FIELDS):
+    usernames = list(set(usernames))
+    if not usernames:
+        return {}
+    if replica.active_replica():
+        fields = [column.strip() for column in columns.split(",")]
+        return {
+            row["username"]: {field: row.get(field) for field in fields}
+            for row in database.replica_get_users(usernames)
+        }
+    response = supa.db.table("users").select(columns).in_("username", usernames).execute()
+    return {row["username"]: row for row in response.data}
+
+class UserLoader:
+    """
+    Request-scoped user resolver.
+
+    Usernames passed to prime() are collected and fetched together with one
+    in_() query the first time any of them is loaded; results (including misses)
+    are memoized for the lifetime of the loader.
+    """
+
+    def __init__(self, columns=USER_FIELDS):
+        self.columns = columns
+        self._pending = set()
+        self._users = {}
+
+    def prime(self, *usernames):
+        self._pending.update(name for name in usernames if name and name not in self._users)
+
+    def load(self, username):
+        if username not in self._users:
+            self.prime(username)
+            self._flush()
+        return self._users.get(username) or False
+
+    def load_many(self, usernames):
+        self.prime(*usernames)
+        return [self.load(username) for username in usernames]
+
+    def _flush(self):
+        if not self._pending:
+            return
+        rows = get_users_by_usernames(self._pending, self.columns)
+        for username in self._pending:
+            self._users[username] = rows.get(username)
+        self._pending.clear()
+
+def get_all_wallet_ids():
+    if replica.active_replica():
+        return database.replica_wallet_ids()
+    response = supa.db.table("users").select("wallet_id").not_.is_("wallet_id", "null").execute()
+    return [row["wallet_id"] for row in response.data]
+
+def wallet_exists(wallet_id):
+    if replica.active_replica():
+        return database.replica_wallet_exists(wallet_id)
+    response = supa.db.table("users").select("username").eq("wallet_id", wallet_id).limit(1).execute()
+    return response.data != []
+
 def update_wallet(username, wallet_id):
-    response = db.table("users").update({"wallet_id": wallet_id}).eq("username", username).execute()
+    response = supa.db.table("users").update({"wallet_id": wallet_id}).eq("username", username).execute()
+    _sync_replica("users", response.data)
 
     if response.data==[]:
         return False
@@ -56,11 +154,18 @@ def insert_listing(username, listing_name, price, listing_desc):
         "price": price,
         "listing_description": listing_desc
     }
-    response = db.table("listings").insert(data).execute()
+    response = supa.db.table("listings").insert(data).execute()
+    listing_cache.invalidate()
+    _sync_replica("listings", response.data)
+    for row in response.data:
+        _sync_search_index(database.index_listing, row["id"], listing_name, listing_desc, price)
     return response.data
 
 def remove_listing(id):
-    response = db.table("listings").delete().eq("id", id).execute()
+    response = supa.db.table("listings").delete().eq("id", id).execute()
+    listing_cache.invalidate()
+    _sync_replica("listings", deleted=[row["id"] for row in response.data])
+    _sync_search_index(database.unindex_listing, id)
     if response.data==[]:
         return False 
     else:
@@ -72,39 +177,163 @@ def update_listing(id, listing_name, price, listing_desc):
         "price": price,
         "listing_description": listing_desc
         }
-    response = db.table("listings").update(data).eq("id", id).execute()
+    response = supa.db.table("listings").update(data).eq("id", id).execute()
+    listing_cache.invalidate()
+    _sync_replica("listings", response.data)
     if response.data==[]:
         return False 
     else:
+        _sync_search_index(database.index_listing, id, listing_name, listing_desc, price)
         return True
 
 def update_buyer(id, username, priv_key, condition):
     data = {"buyer_name": username, "escrow_fufill": priv_key,  "escrow_condition": condition}
-    response = db.table("listings").update(data).eq("id", id).execute()
+    response = supa.db.table("listings").update(data).eq("id", id).execute()
+    listing_cache.invalidate()
+    _sync_replica("listings", response.data)
     if response.data==[]:
         return False 
     else:
         return True
     
-def update_escrow(id, transaction_hash):
+def update_escrow(id, transaction_hash, escrow_sequence=None):
     data = {"transaction_hash": transaction_hash}
-    response = db.table("listings").update(data).eq("id", id).execute()
+    if escrow_sequence is not None:
+        data["escrow_sequence"] = escrow_sequence
+    response = supa.db.table("listings").update(data).eq("id", id).execute()
+    listing_cache.invalidate()
+    _sync_replica("listings", response.data)
     if response.data==[]:
         return False 
     else:
         return True
 
+def update_escrows(matches):
+    # Escrow write-back from the reconciler: matches carry id, escrow_condition, escrow_sequence and
+    # transaction_hash. Each update only applies while the listing still has no sequence and the same
+    # condition, so a concurrent update, reset or delete is never overwritten or undone. PostgREST
+    # can't attach a per-row condition to a bulk upsert, hence one conditional UPDATE per match.
+    updated = []
+    for match in matches:
+        response = (supa.db.table("listings")
+                    .update({"escrow_sequence": match["escrow_sequence"],
+                             "transaction_hash": match["transaction_hash"]})
+                    .eq("id", match["id"])
+                    .is_("escrow_sequence", "null")
+                    .eq("escrow_condition", match["escrow_condition"])
+                    .execute())
+        updated += response.data
+    if updated:
+        listing_cache.invalidate()
+        _sync_replica("listings", updated)
+    return len(updated)
 
-def get_all_listings():
-    response = db.table("listings").select("*").execute()
-    if response.data==[]:
-        return False 
-    else:
-        return response.data
+def get_pending_escrow_listings():
+    # Listings with a buyer and generated condition whose EscrowCreate hasn't been matched yet
+    response = (supa.db.table("listings").select("*")
+                .not_.is_("buyer_name", "null")
+                .not_.is_("escrow_condition", "null")
+                .is_("escrow_sequence", "null")
+                .execute())
+    return response.data
+
+def get_all_listings(fields=None):
+    local = replica.active_replica()
+    if local:
+        # Decoding every row is the expensive part, so keep the result until the replica changes
+        return listing_cache.get_or_load(
+            ("replica", tuple(fields or ()), local.generations["listings"]),
+            lambda: _project(database.replica_listings(), fields) or False,
+        )
+    columns = ", ".join(fields) if fields else "*"
+    def load():
+        response = supa.db.table("listings").select(columns).execute()
+        if response.data==[]:
+            return False 
+        else:
+            return response.data
+    return listing_cache.get_or_load(("all", columns), load)
+
+def get_listings_page(after_id=None, limit=50, seller=None, available=False,
+                      min_price=None, max_price=None, fields=LISTING_PUBLIC_FIELDS):
+    # Keyset pagination on id: each page is an indexed range scan of `limit` rows
+    if replica.active_replica():
+        rows = database.replica_listings(after_id, limit, seller, available, min_price, max_price)
+        return _project(rows, dict.fromkeys(("id",) + tuple(fields)))
+    columns = ", ".join(dict.fromkeys(("id",) + tuple(fields)))
+    key = ("page", after_id, limit, seller, available, min_price, max_price, columns)
+    return listing_cache.get_or_load(
+        key, lambda: _fetch_listings_page(after_id, limit, seller, available, min_price, max_price, columns)
+    )
+
+def _fetch_listings_page(after_id, limit, seller, available, min_price, max_price, columns):
+    query = supa.db.table("listings").select(columns).order("id").limit(limit)
+    if after_id is not None:
+        query = query.gt("id", after_id)
+    if seller:
+        query = query.eq("seller_name", seller)
+    if available:
+        query = query.is_("buyer_name", "null")
+    if min_price is not None:
+        query = query.gte("price", min_price)
+    if max_price is not None:
+        query = query.lte("price", max_price)
+    response = query.execute()
+    return response.data
 
 def get_listing(id):
-    response = db.table("listings").select("*").eq("id", id).execute()
-    if response.data==[]:
-        return False 
-    else:
-        return response.data[0]
\ No newline at end of file
+    if replica.active_replica():
+        return database.replica_get_listing(id) or False
+    def load():
+        response = supa.db.table("listings").select("*").eq("id", id).execute()
+        if response.data==[]:
+            return False 
+        else:
+            return response.data[0]
+    return listing_cache.get_or_load(("listing", id), load)
+
+def _project(rows, fields):
+    # Column projection for replica reads, matching what select(columns) returns
+    if not fields:
+        return rows
+    return [{field: row.get(field) for field in fields} for row in rows]
+
+# local replica
+def _sync_replica(table, rows=(), deleted=()):
+    # Read-your-writes for replica reads; like the search index, a failure here must not fail the write
+    local = replica.active_replica()
+    if local is None:
+        return
+    try:
+        local.apply(table, rows)
+        local.remove(table, deleted)
+    except Exception as e:
+        print(f"Replica update failed: {e}")
+
+# listing search
+_search_index_ready = False
+
+def _sync_search_index(fn, *args):
+    # The search index is derived data; a failed update must not fail the write,
+    # but it drops the built marker so the next search rebuilds the index from Supabase
+    global _search_index_ready
+    try:
+        fn(*args)
+    except Exception as e:
+        print(f"Listing search index update failed: {e}")
+        _search_index_ready = False
+        try:
+            database.clear_listing_index_built()
+        except Exception as e:
+            print(f"Could not mark listing search index for rebuild: {e}")
+
+def search_listings(query, limit=20, offset=0):
+    # Build the local index from Supabase once; the built marker persists across restarts
+    global _search_index_ready
+    if not _search_index_ready:
+        if not database.listing_index_built():
+            listings = get_all_listings(("id", "listing_name", "listing_description", "price"))
+            # An empty catalog still gets the marker, so it isn't re-read on every search
+            database.rebuild_listing_index(listings or [])
+        _search_index_ready = True
+    return database.search_listings(query, limit, offset)
@@ -0,0 +1,350 @@
+# Batch issued-currency distribution (airdrops).
+#
+# Sends many issuer -> holder payments without waiting on each one:
+#
+#   1. Preflight: one paginated AccountLines walk of the issuer's trust lines
+#      checks every recipient's line, freeze state and remaining limit.
+#   2. Payments are signed locally with consecutive sequence numbers and
+#      submitted (SubmitOnly) up to max_in_flight ahead of the last validated one.
+#   3. Outcomes are read in bulk from the issuer's account_tx over each newly
+#      validated ledger range, matched by transaction hash.
+#
+# Progress is written to a JSON state file after every step, so an interrupted
+# run picks up where it stopped without paying anyone twice. Run from the shell:
+#
+#     python -m distribution payments.csv --state airdrop.json --report report.csv
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from xrpl import XRPLException
+from xrpl.ledger import get_fee
+from xrpl.models.amounts import IssuedCurrencyAmount
+from xrpl.models.requests import AccountInfo, AccountLines, AccountTx, Ledger, SubmitOnly
+from xrpl.models.transactions import Payment
+from xrpl.transaction import sign
+
+import xrpl_registry
+
+PENDING = "pending"  # not signed with a live sequence yet
+SUBMITTED = "submitted"  # handed to rippled, waiting for a validated ledger
+VALIDATED = "validated"  # in a validated ledger with tesSUCCESS
+FAILED = "failed"  # validated with a tec code, or rejected permanently before applying
+SKIPPED = "skipped"  # failed the trust line preflight, never sent
+FINAL_STATUSES = (VALIDATED, FAILED, SKIPPED)
+
+REPORT_FIELDS = ("index", "recipient", "currency", "amount", "status", "result", "hash", "ledger_index", "error")
+
+
+def _decode_currency(code):
+    # 40-char hex codes carry an ASCII name, e.g. 4554480000... -> "ETH"
+    if len(code) != 40:
+        return code
+    try:
+        return bytes.fromhex(code).decode("ascii").rstrip("\x00")
+    except ValueError:
+        return code
+
+
+class DistributionEngine:
+    """
+    Distributes issued currency from issuer_wallet to many recipients.
+
+    payments is a list of (recipient, currency, amount). With state_path set,
+    the run is resumable: the file records every payment's sequence, signed
+    blob and hashes, and a restarted engine first waits for those blobs to
+    validate or pass their LastLedgerSequence before signing anything new.
+    """
+
+    def __init__(self, issuer_wallet, payments, client=None, state_path=None, max_in_flight=200,
+                 ledger_window=20, poll_interval=1.0, submit_workers=8, max_fee=0.0001):
+        self.wallet = issuer_wallet
+        self.issuer = issuer_wallet.classic_address
+        self.client = client or xrpl_registry.get_client()
+        self.state_path = state_path
+        self.max_in_flight = max_in_flight
+        self.ledger_window = ledger_window
+        self.poll_interval = poll_interval
+        self.max_fee = max_fee
+        self._executor = ThreadPoolExecutor(max_workers=submit_workers, thread_name_prefix="xrpl-distribute")
+        self._lock = threading.Lock()
+        self._next_sequence = None
+        self._rewind = False
+        self.state = self._load_state(payments)
+
+    # --- state ---
+
+    def _load_state(self, payments):
+        rows = [
+            {"index": i, "recipient": recipient, "currency": currency, "amount": str(amount)}
+            for i, (recipient, currency, amount) in enumerate(payments)
+        ]
+        if self.state_path and os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                state = json.load(f)
+            saved = [{key: p[key] for key in ("index", "recipient", "currency", "amount")} for p in state["payments"]]
+            if state["issuer"] != self.issuer or saved != rows:
+                raise XRPLException(f"{self.state_path} was written for a different issuer or payment list")
+            return state
+        for row in rows:
+            row.update(status=PENDING, code=row["currency"], sequence=None, last_ledger_sequence=None,
+                       tx_blob=None, hashes=[], hash=None, engine_result=None, result=None,
+                       ledger_index=None, error=None, retry=False)
+        return {"issuer": self.issuer, "scanned_through": None, "payments": rows}
+
+    def save(self):
+        if not self.state_path:
+            return
+        tmp_path = self.state_path + ".tmp"
+        with self._lock:
+            with open(tmp_path, "w") as f:
+                json.dump(self.state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def _payments(self, *statuses):
+        return [p for p in self.state["payments"] if p["status"] in statuses]
+
+    # --- ledger reads ---
+
+    def _validated_ledger_index(self):
+        return self.client.request(Ledger(ledger_index="validated")).result["ledger_index"]
+
+    def _account_sequence(self):
+        response = self.client.request(AccountInfo(account=self.issuer, ledger_index="current"))
+        if not response.is_successful():
+            raise XRPLException(response.result.get("error_message") or response.result.get("error"))
+        return response.result["account_data"]["Sequence"]
+
+    def _issuer_lines(self):
+        marker = None
+        while True:
+            result = self.client.request(AccountLines(account=self.issuer, limit=400, marker=marker)).result
+            yield from result.get("lines", [])
+            marker = result.get("marker")
+            if not marker:
+                break
+
+    # --- steps ---
+
+    def preflight(self):
+        """Marks pending payments whose recipient can't receive them as skipped."""
+        lines = {}
+        for line in self._issuer_lines():
+            lines[(line["account"], line["currency"])] = line
+            lines.setdefault((line["account"], _decode_currency(line["currency"])), line)
+
+        # Seen from the issuer, balance is minus what the holder owns and limit_peer is the holder's limit
+        headroom = {}
+        for p in self._payments(PENDING):
+            line = lines.get((p["recipient"], p["currency"]))
+            if line is None:
+                p.update(status=SKIPPED, error=f"No {p['currency']} trust line to {self.issuer}")
+                continue
+            if line.get("freeze") or line.get("freeze_peer"):
+                p.update(status=SKIPPED, error="Trust line is frozen")
+                continue
+            key = (p["recipient"], line["currency"])
+            if key not in headroom:
+                headroom[key] = float(line["limit_peer"]) + float(line["balance"])
+            if float(p["amount"]) > headroom[key]:
+                p.update(status=SKIPPED, error=f"Amount exceeds the remaining trust limit ({headroom[key]})")
+                continue
+            headroom[key] -= float(p["amount"])
+            p["code"] = line["currency"]
+        self.save()
+
+    def confirm(self, validated_index):
+        """Matches our hashes against the issuer's transactions up to validated_index."""
+        start = self.state["scanned_through"]
+        if start is None or validated_index <= start:
+            return
+        by_hash = {h: p for p in self._payments(SUBMITTED) for h in p["hashes"]}
+        marker = None
+        while by_hash:
+            response = self.client.request(AccountTx(
+                account=self.issuer,
+                ledger_index_min=start + 1,
+                ledger_index_max=validated_index,
+                forward=True,
+                limit=400,
+                marker=marker,
+            ))
+            if not response.is_successful():
+                raise XRPLException(response.result.get("error_message") or response.result.get("error"))
+            for entry in response.result.get("transactions", []):
+                tx = entry.get("tx_json") or entry.get("tx") or {}
+                tx_hash = entry.get("hash") or tx.get("hash")
+                p = by_hash.pop(tx_hash, None)
+                if p is None:
+                    continue
+                result = (entry.get("meta") or {}).get("TransactionResult")
+                p.update(
+                    status=VALIDATED if result == "tesSUCCESS" else FAILED,
+                    result=result,
+                    hash=tx_hash,
+                    ledger_index=entry.get("ledger_index") or tx.get("ledger_index"),
+                    tx_blob=None,
+                    retry=False,
+                )
+            marker = response.result.get("marker")
+            if not marker:
+                break
+        self.state["scanned_through"] = validated_index
+
+    def expire(self, validated_index):
+        """Returns submitted payments whose LastLedgerSequence has passed to pending."""
+        for p in self._payments(SUBMITTED):
+            if p["last_ledger_sequence"] <= validated_index:
+                p.update(status=PENDING, sequence=None, last_ledger_sequence=None, tx_blob=None, retry=False)
+                # A sequence in the middle of the chain never applied; everything after it has to be re-signed
+                self._rewind = True
+
+    def fill(self, validated_index):
+        """Signs and submits pending payments until max_in_flight are outstanding."""
+        room = self.max_in_flight - len(self._payments(SUBMITTED))
+        batch = self._payments(PENDING)[:max(room, 0)]
+        if not batch:
+            return
+        if self._next_sequence is None:
+            self._next_sequence = self._account_sequence()
+        fee = get_fee(self.client, max_fee=self.max_fee)
+        last_ledger_sequence = validated_index + self.ledger_window
+
+        for p in batch:
+            signed = sign(Payment(
+                account=self.issuer,
+                destination=p["recipient"],
+                amount=IssuedCurrencyAmount(currency=p["code"], issuer=self.issuer, value=p["amount"]),
+                sequence=self._next_sequence,
+                fee=fee,
+                last_ledger_sequence=last_ledger_sequence,
+            ), self.wallet)
+            p.update(status=SUBMITTED, sequence=self._next_sequence, last_ledger_sequence=last_ledger_sequence,
+                     tx_blob=signed.blob(), engine_result=None, retry=False)
+            p["hashes"].append(signed.get_hash())
+            self._next_sequence += 1
+
+        # Hashes are on disk before anything is sent, so a crash can't lose track of a payment
+        self.save()
+        list(self._executor.map(self._submit, batch))
+
+    def _submit(self, p):
+        # A retried blob may already have reached rippled on an attempt whose response we lost
+        resubmitted = p["retry"]
+        try:
+            result = self.client.request(SubmitOnly(tx_blob=p["tx_blob"])).result
+        except Exception as e:
+            p.update(retry=True, error=str(e))
+            return
+        engine_result = result.get("engine_result")
+        if engine_result is None:
+            p.update(retry=True, error=result.get("error_message") or result.get("error") or "No engine_result")
+            return
+        p.update(engine_result=engine_result, retry=False, error=None)
+        if engine_result.startswith(("tes", "ter", "tec")):
+            return
+        if engine_result.startswith("tel"):
+            # Rejected by this server for now (queue full, fee spike); the same blob stays valid
+            p.update(retry=True, error=result.get("engine_result_message"))
+            return
+        if engine_result in ("tefPAST_SEQ", "tefALREADY") or (resubmitted and engine_result.startswith("tef")):
+            # The sequence may have been used by this very blob, so it stays submitted under its hash;
+            # confirm() finds it if it applied, and expire() re-signs it once its LastLedgerSequence passes
+            return
+        with self._lock:
+            # tem / tef on a first submit: this payment never applied, and its sequence is now a gap
+            p.update(status=FAILED, result=engine_result, tx_blob=None,
+                     error=result.get("engine_result_message") or result.get("error_message"))
+            self._rewind = True
+
+    def resubmit(self):
+        retries = [p for p in self._payments(SUBMITTED) if p["retry"]]
+        list(self._executor.map(self._submit, retries))
+
+    # --- driver ---
+
+    def run(self):
+        """Runs until every payment is validated, failed or skipped; returns the report."""
+        self.preflight()
+        if self.state["scanned_through"] is None:
+            self.state["scanned_through"] = self._validated_ledger_index()
+        # Blobs from an interrupted run may still validate; settle them before reusing sequences
+        self._rewind = bool(self._payments(SUBMITTED))
+
+        while self._payments(PENDING, SUBMITTED):
+            validated_index = self._validated_ledger_index()
+            self.confirm(validated_index)
+            self.expire(validated_index)
+            if self._rewind and not self._payments(SUBMITTED):
+                # Every outstanding blob has validated or expired, so the account sequence is settled
+                self._next_sequence = None
+                self._rewind = False
+            if not self._rewind:
+                self.fill(validated_index)
+            self.resubmit()
+            self.save()
+            if self._payments(SUBMITTED):
+                time.sleep(self.poll_interval)
+
+        self.save()
+        return self.report()
+
+    def report(self):
+        return [{field: p.get(field) for field in REPORT_FIELDS} for p in self.state["payments"]]
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+def distribute_issued_currency(issuer_wallet, payments, client=None, state_path=None, **options):
+    """
+    Sends each (recipient, currency, amount) from issuer_wallet; see DistributionEngine.
+
+    Returns:
+        list[dict]: One row per payment with its status, result code, hash and ledger.
+    """
+    engine = DistributionEngine(issuer_wallet, payments, client, state_path, **options)
+    try:
+        return engine.run()
+    finally:
+        engine.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Distribute issued currency from the issuer wallet")
+    parser.add_argument("payments", help="CSV with recipient,currency,amount columns")
+    parser.add_argument("--state", help="state file for resuming (default: <payments>.state.json)")
+    parser.add_argument("--report", help="write the per-recipient report to this CSV")
+    parser.add_argument("--wallet", default="issuer_wallet", help="wallet name from xrpl_registry.WALLET_SEEDS")
+    parser.add_argument("--max-in-flight", type=int, default=200)
+    parser.add_argument("--ledger-window", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    with open(args.payments, newline="") as f:
+        payments = [(row["recipient"], row["currency"], row["amount"]) for row in csv.DictReader(f)]
+
+    report = distribute_issued_currency(
+        xrpl_registry.get_wallet(args.wallet),
+        payments,
+        state_path=args.state or args.payments + ".state.json",
+        max_in_flight=args.max_in_flight,
+        ledger_window=args.ledger_window,
+    )
+
+    if args.report:
+        with open(args.report, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+            writer.writeheader()
+            writer.writerows(report)
+    counts = {}
+    for row in report:
+        counts[row["status"]] = counts.get(row["status"], 0) + 1
+    print(", ".join(f"{status}: {count}" for status, count in sorted(counts.items())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import os
+import threading
+
+from xrpl.models.requests import AccountTx
+
+import db
+import xrpl_registry
+
+
+class EscrowReconciler:
+    """
+    Background job that fills in escrow_sequence and transaction_hash on listings.
+
+    Each pass loads listings that have a buyer and condition but no sequence,
+    scans the buyers' recent validated transactions for an EscrowCreate carrying
+    the listing's condition, paying the listing price to the seller's wallet,
+    and writes each match back with a conditional update that leaves listings
+    changed in the meantime alone. Ledger-stream events for buyer wallets are
+    matched immediately, so the polling pass is only a fallback.
+    """
+
+    def __init__(self, client, interval=10.0, scan_limit=100):
+        self.client = client
+        self.interval = interval
+        self.scan_limit = scan_limit
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="escrow-reconciler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def on_stream_event(self, event):
+        # Ledger-stream listener: an EscrowCreate from a watched wallet triggers a pass right away
+        if event["type"] != "account":
+            return
+        message = event["transaction"]
+        tx = message.get("tx_json") or message.get("transaction") or {}
+        if tx.get("TransactionType") == "EscrowCreate":
+            self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Escrow reconciler error: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def run_once(self):
+        """Matches pending listings against validated EscrowCreates. Returns the number updated."""
+        listings = db.get_pending_escrow_listings()
+        if not listings:
+            return 0
+
+        users = db.get_users_by_usernames(
+            [listing["buyer_name"] for listing in listings] + [listing["seller_name"] for listing in listings])
+        pending_by_wallet = {}
+        for listing in listings:
+            wallet_id = (users.get(listing["buyer_name"]) or {}).get("wallet_id")
+            seller_wallet = (users.get(listing["seller_name"]) or {}).get("wallet_id")
+            if wallet_id and seller_wallet:
+                pending = pending_by_wallet.setdefault(wallet_id, {})
+                pending[listing["escrow_condition"].upper()] = (listing, seller_wallet)
+
+        matched = []
+        for wallet_id, pending in pending_by_wallet.items():
+            for entry in self._recent_escrow_creates(wallet_id):
+                tx = entry.get("tx_json") or entry.get("tx") or {}
+                condition = (tx.get("Condition") or "").upper()
+                listing, seller_wallet = pending.get(condition, (None, None))
+                # Conditions are public once submitted, so the escrow must also be the one create_escrow
+                # built: from the buyer (see _recent_escrow_creates) to the seller, for the price in drops
+                if listing is None or tx.get("Destination") != seller_wallet \
+                        or tx.get("Amount") != str(listing["price"]):
+                    continue
+                del pending[condition]
+                matched.append({
+                    "id": listing["id"],
+                    "escrow_condition": listing["escrow_condition"],
+                    "escrow_sequence": tx.get("Sequence") or tx.get("TicketSequence"),
+                    "transaction_hash": entry.get("hash") or tx.get("hash"),
+                })
+                if not pending:
+                    break
+
+        return db.update_escrows(matched)
+
+    def _recent_escrow_creates(self, address):
+        response = self.client.request(AccountTx(
+            account=address,
+            ledger_index_min=-1,
+            ledger_index_max=-1,
+            limit=self.scan_limit,
+            forward=False,
+        ))
+        for entry in response.result.get("transactions", []):
+            tx = entry.get("tx_json") or entry.get("tx") or {}
+            meta = entry.get("meta") or {}
+            if (entry.get("validated")
+                    and tx.get("TransactionType") == "EscrowCreate"
+                    and tx.get("Account") == address
+                    and meta.get("TransactionResult") == "tesSUCCESS"):
+                yield entry
+
+
+reconciler = None
+
+
+def start_escrow_reconciler(stream=None):
+    global reconciler
+    if reconciler is None:
+        reconciler = EscrowReconciler(
+            xrpl_registry.get_client(),
+            interval=float(os.getenv("ESCROW_RECONCILE_INTERVAL", "10")),
+        )
+        if stream is not None:
+            stream.add_listener(reconciler.on_stream_event)
+        reconciler.start()
+    return reconciler
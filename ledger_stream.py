@@ -0,0 +1,217 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from xrpl.clients import WebsocketClient
+from xrpl.models.requests import Subscribe, StreamParameter
+
+import xrpl_registry
+
+# Seconds without any message before the connection is treated as dead
+STREAM_IDLE_TIMEOUT = 30
+
+
+class LedgerStream:
+    """
+    Background subscriber to rippled's ledger and transactions streams.
+
+    Listeners receive plain dict events:
+        {"type": "ledger", "ledger_index": int, "changed": set | None}
+        {"type": "account", "addresses": [str], "ledger_index": int, "transaction": dict}
+        {"type": "connected"} / {"type": "disconnected"}
+
+    A ledger event is published once all of the ledger's transactions (its
+    ledgerClosed txn_count) have arrived, with changed holding every account
+    they touched. changed is None when that set isn't known: the subscribe
+    response, or a ledger whose transactions didn't all arrive before later
+    ledgers closed. Account events are only published for watched addresses.
+    """
+
+    # Ledgers still waiting for transactions once this many newer ones have closed are given up on
+    PENDING_LEDGERS = 3
+
+    def __init__(self, url, reconnect_delay=5):
+        self.url = url
+        self.reconnect_delay = reconnect_delay
+        self.connected = False
+        self._listeners = []
+        self._watched = set()
+        # ledger_index -> [expected txn_count or None, hashes seen, changed accounts]
+        self._pending = {}
+        self._client = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def watch(self, addresses):
+        """Adds addresses to the account subscription, live if already connected."""
+        with self._lock:
+            new = [address for address in addresses if address and address not in self._watched]
+            self._watched.update(new)
+            client = self._client
+        if new and client is not None and self.connected:
+            client.send(Subscribe(accounts=new))
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="ledger-stream", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        client = self._client
+        if client is not None:
+            client.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with WebsocketClient(self.url, timeout=STREAM_IDLE_TIMEOUT) as client:
+                    with self._lock:
+                        self._client = client
+                        accounts = sorted(self._watched)
+                    self._pending.clear()
+                    client.send(Subscribe(
+                        streams=[StreamParameter.LEDGER, StreamParameter.TRANSACTIONS],
+                        accounts=accounts or None,
+                    ))
+                    self.connected = True
+                    self._publish({"type": "connected"})
+                    for message in client:
+                        if self._stop.is_set():
+                            break
+                        self._handle(message)
+            except Exception as e:
+                print(f"Ledger stream error: {e}")
+            finally:
+                self._client = None
+                if self.connected:
+                    self.connected = False
+                    self._publish({"type": "disconnected"})
+            self._stop.wait(self.reconnect_delay)
+
+    def _handle(self, message):
+        kind = message.get("type")
+        if kind == "ledgerClosed":
+            ledger_index = message["ledger_index"]
+            self._pending.setdefault(ledger_index, [None, set(), set()])[0] = message.get("txn_count", 0)
+            for stale in [index for index in self._pending if index <= ledger_index - self.PENDING_LEDGERS]:
+                del self._pending[stale]
+            self._complete(ledger_index)
+        elif kind == "transaction" and message.get("validated"):
+            accounts = affected_accounts(message)
+            ledger_index = message.get("ledger_index")
+            tx_hash = message.get("hash") or (message.get("transaction") or {}).get("hash")
+            if ledger_index is not None and tx_hash:
+                # Counted by hash: a watched account's transactions arrive once per subscription
+                pending = self._pending.setdefault(ledger_index, [None, set(), set()])
+                pending[1].add(tx_hash)
+                pending[2].update(accounts)
+                self._complete(ledger_index)
+            with self._lock:
+                addresses = [a for a in accounts if a in self._watched]
+            if addresses:
+                self._publish({
+                    "type": "account",
+                    "addresses": addresses,
+                    "ledger_index": message.get("ledger_index"),
+                    "transaction": message,
+                })
+        elif "result" in message and "ledger_index" in message.get("result", {}):
+            # Subscribe response carries the current validated ledger
+            self._publish({"type": "ledger", "ledger_index": message["result"]["ledger_index"], "changed": None})
+
+    def _complete(self, ledger_index):
+        expected, seen, changed = self._pending[ledger_index]
+        if expected is None or len(seen) < expected:
+            return
+        del self._pending[ledger_index]
+        self._publish({"type": "ledger", "ledger_index": ledger_index, "changed": changed})
+
+    def _publish(self, event):
+        for listener in self._listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"Ledger stream listener error: {e}")
+
+
+def affected_accounts(message):
+    """Collects every account touched by a streamed transaction (sender, destination and metadata)."""
+    tx = message.get("tx_json") or message.get("transaction") or {}
+    accounts = {tx.get("Account"), tx.get("Destination")}
+    for node in (message.get("meta") or {}).get("AffectedNodes", []):
+        entry = next(iter(node.values()))
+        fields = entry.get("FinalFields") or entry.get("NewFields") or {}
+        if entry.get("LedgerEntryType") == "AccountRoot":
+            accounts.add(fields.get("Account"))
+        elif entry.get("LedgerEntryType") == "RippleState":
+            accounts.add((fields.get("HighLimit") or {}).get("issuer"))
+            accounts.add((fields.get("LowLimit") or {}).get("issuer"))
+    accounts.discard(None)
+    return accounts
+
+
+# --- Process-wide stream wired into the read caches ---
+
+stream = None
+_refresh_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ledger-stream-refresh")
+
+
+def cache_listener(cache, connected_ttl=None):
+    """
+    Returns a stream listener that keeps a LedgerCache in step with the ledger:
+    entries for addresses a ledger didn't touch are carried forward to it, and
+    the validated index is trusted for longer while the stream is connected.
+    """
+    polling_ttl = cache.ledger_ttl
+    if connected_ttl is None:
+        connected_ttl = float(os.getenv("LEDGER_STREAM_TTL", "10"))
+
+    def on_event(event):
+        if event["type"] == "ledger":
+            # Ledger events already drop every address the ledger touched; invalidating on account
+            # events as well would also drop data re-read at the new ledger by a late duplicate
+            cache.advance(event["ledger_index"], event.get("changed"))
+        elif event["type"] == "connected":
+            # Ledger closes are pushed to us, so the cached index can be trusted for longer
+            cache.ledger_ttl = connected_ttl
+        elif event["type"] == "disconnected":
+            cache.ledger_ttl = polling_ttl
+
+    return on_event
+
+
+def start_ledger_stream(url=None):
+    """
+    Starts the shared stream, subscribed to every user wallet, and wires it to
+    the account cache and the local transaction-history index.
+    """
+    global stream
+    if stream is not None:
+        return stream
+
+    import db
+    import database
+    import xrpl_utilities
+
+    def sync_history(event):
+        if event["type"] == "account":
+            for address in event["addresses"]:
+                _refresh_executor.submit(database.sync_transaction_history, address)
+
+    stream = LedgerStream(url or xrpl_registry.get_websocket_url())
+    stream.add_listener(cache_listener(xrpl_utilities.account_cache))
+    stream.add_listener(sync_history)
+    stream.watch(db.get_all_wallet_ids())
+    stream.start()
+    return stream
+
+
+def watch_accounts(addresses):
+    if stream is not None:
+        stream.watch(addresses)
@@ -2,13 +2,20 @@ import os
 import datetime
 import jwt
 import json
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 import xrpl_utilities
+import database
+import ledger_stream
+import submission_queue
+import escrow_reconciler
+import replica
+import passwords
+import metrics
+import profiling
+from auth import require_auth
 from xrpl_client import XRPLClient
-from xrpl.transaction import submit_and_wait
-from xrpl.clients import JsonRpcClient
 import db
 
 # Load environment variables from .env
@@ -16,9 +23,35 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
 JSON_RPC_URL = os.getenv("JSON_RPC_URL")
 
+# Shared XRPL client (pooled connections, see xrpl_registry)
+xrpl_client = XRPLClient(JSON_RPC_URL)
+
 # Initialize Flask app and enable CORS
 app = Flask(__name__)
 CORS(app)
+metrics.init_app(app)
+profiling.init_app(app)
+
+# Request threads are short-lived; hand their SQLite connection back to the pool
+@app.teardown_appcontext
+def release_database_connection(exc):
+    database.release_connection()
+
+# Background services only run in the serving process. bcrypt pool workers start via
+# forkserver and re-import this module as __mp_main__ when it is run as `python main.py`.
+SERVING = __name__ != "__mp_main__"
+
+# Push-based cache invalidation from rippled's WebSocket ledger stream
+if SERVING and os.getenv("LEDGER_STREAM") == "1":
+    ledger_stream.start_ledger_stream()
+
+# Serve user / listing reads from a local SQLite mirror of Supabase
+if SERVING and os.getenv("REPLICA") == "1":
+    replica.start_replica()
+
+# Writes escrow_sequence / transaction_hash back to listings once EscrowCreates validate
+if SERVING and os.getenv("ESCROW_RECONCILER") == "1":
+    escrow_reconciler.start_escrow_reconciler(ledger_stream.stream)
 
 # --- Basic Utility Route ---
 
@@ -28,6 +61,36 @@ def ping():
     return jsonify({"message": "pong"}), 200
 
 
+# Prometheus scrape endpoint: route, rippled, Supabase and bcrypt latency plus cache hit ratios
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+# Recent request profiles (admin only: send X-Profile: <PROFILE_TOKEN>)
+@app.route("/debug/profiles", methods=["GET"])
+def list_profiles():
+    if not profiling.profiler.is_admin(request.headers.get(profiling.PROFILE_HEADER)):
+        return jsonify({'error': 'Forbidden'}), 403
+    return jsonify({"profiles": profiling.profiler.list()}), 200
+
+
+# Folded stacks for one profile, ready for flamegraph.pl or speedscope (?kind=wall|cpu)
+@app.route("/debug/profiles/<profile_id>", methods=["GET"])
+def download_profile(profile_id):
+    if not profiling.profiler.is_admin(request.headers.get(profiling.PROFILE_HEADER)):
+        return jsonify({'error': 'Forbidden'}), 403
+    profile = profiling.profiler.get(profile_id)
+    if profile is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    kind = request.args.get("kind", "wall")
+    if kind not in ("wall", "cpu"):
+        return jsonify({'error': 'kind must be wall or cpu'}), 400
+    return Response(profile.collapsed(kind), content_type="text/plain; charset=utf-8", headers={
+        "Content-Disposition": f"attachment; filename={profile_id}.{kind}.folded",
+    })
+
+
 # --- User Authentication ---
 
 # Login route: verifies user credentials and returns a JWT token if valid
@@ -47,6 +110,8 @@ def login():
             return jsonify({'token': token}), 200
         else:
             return jsonify({'error': 'Invalid credentials'}), 401
+    except passwords.PasswordServiceBusy as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
         print(e)
         return jsonify({'error': 'Unknown error'}), 500
@@ -65,6 +130,8 @@ def register():
             return jsonify({'message': 'User registered successfully'}), 201
         else:
             return jsonify({'message': 'Unknown error creating user'}), 500
+    except passwords.PasswordServiceBusy as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
         print(e)
         return jsonify({'error': 'Unknown error'}), 500
@@ -107,13 +174,15 @@ def get_all_user():
         return jsonify({'error': 'Unknown error'}), 500
 
 @app.route("/app/update_wallet", methods=['GET'])
+@require_auth
 def update_wallet():
     try:
         data = json.loads(request.get_data(as_text=True))
-        username = data["username"]
+        username = g.username
         wallet_id = data["wallet_id"]
         data = db.update_wallet(username, wallet_id)
         if data:
+            ledger_stream.watch_accounts([wallet_id])
             return jsonify({"message": "Success", "data": data}), 200
         else:
             return jsonify({'error': 'User not found'}), 404
@@ -123,12 +192,22 @@ def update_wallet():
 
 # --- Listings ---
 
+def _check_seller(id):
+    # Only the listing's seller may change or delete it; returns an error response otherwise
+    listing = db.get_listing(id)
+    if not listing:
+        return jsonify({'error': 'Listing not found'}), 404
+    if (listing.get("seller_name") or listing.get("username")) != g.username:
+        return jsonify({'error': 'Only the seller can modify this listing'}), 403
+    return None
+
 # Create a new listing
 @app.route("/app/create_listing", methods=['POST'])
+@require_auth
 def create_listing():
     try:
         data = json.loads(request.get_data(as_text=True))
-        username = data["username"]
+        username = g.username
         listing_name = data["listing_name"]
         price = data["price"]  # Ensure it's not a tuple
         listing_desc = data["listing_description"]
@@ -140,10 +219,14 @@ def create_listing():
 
 # Remove a listing by ID
 @app.route("/app/remove_listing", methods=['DELETE'])
+@require_auth
 def remove_listing():
     try:
         data = json.loads(request.get_data(as_text=True))
         id = data["id"]
+        denied = _check_seller(id)
+        if denied:
+            return denied
         db.remove_listing(id)
         return jsonify({'message': 'Listing deleted successfully'}), 200
     except Exception as e:
@@ -152,6 +235,7 @@ def remove_listing():
 
 # Update listing details
 @app.route("/app/update_listing", methods=['PUT'])
+@require_auth
 def update_listing():
     try:
         data = json.loads(request.get_data(as_text=True))
@@ -159,6 +243,9 @@ def update_listing():
         listing_name = data["listing_name"]
         price = data["price"]
         listing_desc = data["listing_description"]
+        denied = _check_seller(id)
+        if denied:
+            return denied
         db.update_listing(id, listing_name, price, listing_desc)
         return jsonify({'message': 'Listing updated successfully'}), 200
     except Exception as e:
@@ -169,18 +256,86 @@ def update_listing():
 @app.route("/app/all_listings", methods=['GET'])
 def all_listings():
     try:
-        data = db.get_all_listings()
+        data = db.get_all_listings(db.LISTING_PUBLIC_FIELDS)
+        return _conditional_json({"message": "Success", "data": data})
+    except Exception as e:
+        print(e)
+        return jsonify({'error': 'Unknown error'}), 500
+
+# Get a page of listings
+# Query params: after (id of the last listing seen), limit, seller, available=1,
+# min_price, max_price, fields (comma-separated subset of db.LISTING_PUBLIC_FIELDS)
+@app.route("/app/listings", methods=['GET'])
+def listings_page():
+    try:
+        args = request.args
+        limit = _int_arg("limit", 50, 1, 200)
+        fields = db.LISTING_PUBLIC_FIELDS
+        if args.get("fields"):
+            fields = tuple(field.strip() for field in args["fields"].split(","))
+            unknown = set(fields) - set(db.LISTING_PUBLIC_FIELDS)
+            if unknown:
+                return jsonify({'error': f"Unknown fields: {', '.join(sorted(unknown))}"}), 400
+        data = db.get_listings_page(
+            after_id=int(args["after"]) if args.get("after") else None,
+            limit=limit,
+            seller=args.get("seller"),
+            available=args.get("available") in ("1", "true"),
+            min_price=float(args["min_price"]) if args.get("min_price") else None,
+            max_price=float(args["max_price"]) if args.get("max_price") else None,
+            fields=fields,
+        )
+        next_after = data[-1]["id"] if len(data) == limit else None
+        return _conditional_json({"message": "Success", "data": data, "next_after": next_after})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(e)
+        return jsonify({'error': 'Unknown error'}), 500
+
+# Full-text search over listing names and descriptions
+# Query params: q, limit, offset
+@app.route("/app/search_listings", methods=['GET'])
+def search_listings():
+    try:
+        query = request.args.get("q", "")
+        limit = _int_arg("limit", 20, 1, 100)
+        offset = _int_arg("offset", 0, 0)
+        data = db.search_listings(query, limit, offset)
         return jsonify({"message": "Success", "data": data}), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(e)
         return jsonify({'error': 'Unknown error'}), 500
 
+def _int_arg(name, default, minimum, maximum=None):
+    # Integer query param clamped to [minimum, maximum]; raises ValueError (the routes' 400) otherwise
+    value = request.args.get(name)
+    if not value:
+        return default
+    try:
+        value = max(int(value), minimum)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
+    return value if maximum is None else min(value, maximum)
+
+def _conditional_json(payload):
+    # Content-hash ETag, so every worker agrees and unchanged polls get a 304
+    response = jsonify(payload)
+    response.add_etag()
+    return response.make_conditional(request)
+
 # Get a specific listing (seems like it deletes a listing too — potential bug)
 @app.route("/app/listing", methods=['GET'])
+@require_auth
 def listing():
     try:
         data = json.loads(request.get_data(as_text=True))
         id = data["id"]
+        denied = _check_seller(id)
+        if denied:
+            return denied
         db.remove_listing(id)  # NOTE: This deletes a listing, which is unexpected in a GET
         return jsonify({"message": "Success", "data": data}), 200
     except Exception as e:
@@ -188,10 +343,14 @@ def listing():
         return jsonify({'error': 'Unknown error'}), 500
 
 @app.route("/app/reset_listing", methods=['PUT'])
+@require_auth
 def reset_listing():
     try:
         data = json.loads(request.get_data(as_text=True))
         id = data["id"]
+        denied = _check_seller(id)
+        if denied:
+            return denied
         db.update_buyer(id, None, None, None)
         return jsonify({'message': 'Listing updated successfully'}), 200
     except Exception as e:
@@ -201,14 +360,21 @@ def reset_listing():
 
 # --- XRP Escrow Routes ---
 
+def _user_loader():
+    # One batched user lookup per request, shared by everything the request resolves
+    if "user_loader" not in g:
+        g.user_loader = db.UserLoader()
+    return g.user_loader
+
 # Create an escrow transaction
 @app.route("/escrow/create", methods=['POST'])
+@require_auth
 def create_escrow():
     try:
         data = json.loads(request.get_data(as_text=True))
         
         listing_id = data["id"]
-        buyer = data["buyer"]
+        buyer = g.username
         cancel_time = data["cancel_after"]
 
         response = db.get_listing(listing_id)
@@ -217,18 +383,20 @@ def create_escrow():
                 "message":"Listing not found"
             }),404
         
-        sender = db.get_user_data_by_username(buyer)["wallet_id"]
-        destination = db.get_user_data_by_username(response["seller_name"])["wallet_id"]
+        users = _user_loader()
+        buyer_data, seller_data = users.load_many([buyer, response["seller_name"]])
+        sender = buyer_data and buyer_data["wallet_id"]
+        destination = seller_data and seller_data["wallet_id"]
 
         if not (sender and destination):
             return jsonify({
                 "message":"Buyer or seller wallet not found"
             }),404
 
-        tx, condition, fullfillment = XRPLClient(JSON_RPC_URL).create_escrow_tx(
+        tx, condition, fullfillment = xrpl_client.create_escrow_tx(
             sender, destination, response["price"], cancel_time
         )
-        db.update_buyer(listing_id, data["buyer"], fullfillment, condition)
+        db.update_buyer(listing_id, buyer, fullfillment, condition)
         tx = json.loads(json.dumps(tx.to_dict()))
 
         return jsonify({
@@ -242,6 +410,7 @@ def create_escrow():
 
 # Finish an escrow transaction
 @app.route("/escrow/finish", methods=['POST'])
+@require_auth
 def finish_escrow():
     try:
         data = json.loads(request.get_data(as_text=True))
@@ -250,9 +419,14 @@ def finish_escrow():
 
         if not response:
             return jsonify({'error': 'Listing not found'}), 404
+        # The payload carries the escrow fulfillment, so only the two parties may build it
+        if g.username not in (response["buyer_name"], response["seller_name"]):
+            return jsonify({'error': 'Only the buyer or seller can finish this escrow'}), 403
 
-        sender = db.get_user_data_by_username(response["buyer_name"])["wallet_id"]
-        destination = db.get_user_data_by_username(response["seller_name"])["wallet_id"]
+        users = _user_loader()
+        buyer_data, seller_data = users.load_many([response["buyer_name"], response["seller_name"]])
+        sender = buyer_data and buyer_data["wallet_id"]
+        destination = seller_data and seller_data["wallet_id"]
 
         if not (sender and 
                 destination and 
@@ -262,7 +436,7 @@ def finish_escrow():
             return jsonify({'error': 'Escrow was not generated successfully, cannot finish'}), 400
  
         
-        payload = json.loads(json.dumps(XRPLClient(JSON_RPC_URL).finish_escrow_tx(
+        payload = json.loads(json.dumps(xrpl_client.finish_escrow_tx(
             destination, sender, response["escrow_sequence"], response["escrow_condition"], response["escrow_fufill"]
         ).to_dict()))
         
@@ -271,6 +445,35 @@ def finish_escrow():
         print(e)
         return jsonify({'error': 'Unknown error'}), 500
 
+# Queue a signed transaction (e.g. a client-signed EscrowCreate/EscrowFinish) for submission
+# Returns a job id right away; poll /jobs/<job_id> for the outcome
+@app.route("/escrow/submit", methods=['POST'])
+@require_auth
+def submit_escrow():
+    try:
+        data = json.loads(request.get_data(as_text=True))
+        tx_blob = data["tx_blob"]
+        try:
+            job_id = submission_queue.get_queue().enqueue(tx_blob, owner=g.username)
+        except submission_queue.QueueFull as e:
+            return jsonify({'error': str(e)}), 503
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify({'message': 'Transaction queued for submission', 'job_id': job_id}), 202
+    except Exception as e:
+        print(e)
+        return jsonify({'error': 'Unknown error'}), 500
+
+# Status of a queued submission
+@app.route("/jobs/<job_id>", methods=['GET'])
+@require_auth
+def get_job(job_id):
+    job = submission_queue.get_queue().get(job_id)
+    # Other users' jobs look the same as missing ones
+    if not job or job["owner"] != g.username:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({"message": "Success", "data": job}), 200
+
 
 # Get XRP balance for an address
 @app.route("/xrp/get_balance")
@@ -282,6 +485,30 @@ def get_balance():
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
+# Get XRP balances and account info for many addresses in one call
+@app.route("/xrp/get_balances", methods=['POST'])
+def get_balances():
+    try:
+        data = json.loads(request.get_data(as_text=True))
+        addresses = data["addresses"]
+        if not isinstance(addresses, list):
+            return jsonify({"error": "addresses must be a list"}), 400
+        if len(addresses) > xrpl_utilities.MAX_BATCH_ADDRESSES:
+            return jsonify({"error": f"At most {xrpl_utilities.MAX_BATCH_ADDRESSES} addresses per request"}), 400
+
+        account_info, errors = xrpl_utilities.get_account_info_batch(addresses)
+        results = {
+            address: {
+                "balance": float(account_data["Balance"]) / 1000000,
+                "account_data": account_data,
+            }
+            for address, account_data in account_info.items()
+        }
+        return jsonify({"results": results, "errors": errors}), 200
+    except Exception as e:
+        print(e)
+        return jsonify({'error': 'Unknown error'}), 500
+
 # Get trustlines for an address
 @app.route("/xrp/get_trustlines")
 def get_trustlines():
@@ -304,19 +531,81 @@ def summarize():
         return jsonify({'error': 'Unknown error'}), 500
 
 # Get transaction history for an address
+# Riverr wallets are answered from the local index (synced incrementally from the ledger),
+# which supports ?start=&end= (ISO dates), ?tx_type=, ?counterparty=, ?limit= and ?cursor=.
+# Other addresses, and ?source=ledger, page directly against rippled; ?stream=1 streams
+# the full history from rippled as NDJSON.
+HISTORY_FILTERS = ("start", "end", "tx_type", "counterparty")
+
 @app.route("/xrp/get_transaction_history")
 def get_transaction_history():
     try:
         address = request.args.get("address")
+        cursor = request.args.get("cursor")
+        if request.args.get("stream") in ("1", "true"):
+            page_size = min(int(request.args.get("limit", 200)), 400)
+            return Response(
+                stream_with_context(_stream_transaction_history(address, page_size)),
+                mimetype="application/x-ndjson",
+            )
+        limit = min(int(request.args.get("limit", 10)), 400)
+        # Only our own wallets are indexed, so callers can't make us backfill arbitrary accounts
+        indexed = request.args.get("source") != "ledger" and db.wallet_exists(address)
+        if not indexed and any(request.args.get(name) for name in HISTORY_FILTERS):
+            return jsonify({"error": "Filters are only available for Riverr wallets"}), 400
+        try:
+            if indexed:
+                before = xrpl_utilities.Transaction.decode_index_cursor(cursor)
+            else:
+                xrpl_utilities.Transaction.decode_ledger_cursor(cursor)
+        except ValueError:
+            return jsonify({"error": "Invalid cursor"}), 400
         try:
-            transaction_history = xrpl_utilities.Transaction.get_transaction_history(address)
-            return jsonify({"Transaction History": transaction_history})
+            start = _parse_timestamp(request.args.get("start"))
+            end = _parse_timestamp(request.args.get("end"))
+        except ValueError:
+            return jsonify({"error": "start and end must be ISO dates"}), 400
+        try:
+            if not indexed:
+                transaction_history, next_cursor = xrpl_utilities.Transaction.get_transaction_history_page(
+                    address, limit, cursor
+                )
+            else:
+                # A new wallet's first pages sync here; the rest backfills in the background
+                database.sync_transaction_history(address, max_pages=database.HISTORY_SYNC_PAGES)
+                transaction_history, next_before = database.query_transaction_history(
+                    address,
+                    start=start,
+                    end=end,
+                    tx_type=request.args.get("tx_type"),
+                    counterparty=request.args.get("counterparty"),
+                    limit=limit,
+                    before=before,
+                )
+                next_cursor = xrpl_utilities.Transaction.encode_cursor(next_before)
+            return jsonify({"Transaction History": transaction_history, "next_cursor": next_cursor})
         except Exception as e:
             return jsonify({"error": str(e)})
     except Exception as e:
         print(e)
         return jsonify({'error': 'Unknown error'}), 500
 
+def _parse_timestamp(value):
+    if not value:
+        return None
+    parsed = datetime.datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return int(parsed.timestamp())
+
+def _stream_transaction_history(address, page_size):
+    try:
+        for transaction in xrpl_utilities.Transaction.iter_transaction_history(address, page_size):
+            yield json.dumps(transaction) + "\n"
+    except Exception as e:
+        print(e)
+        yield json.dumps({"error": str(e)}) + "\n"
+
 
 # --- App Runner ---
 if __name__ == "__main__":
@@ -0,0 +1,225 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+import httpx
+
+# Prometheus text exposition format, version 0.0.4
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latency buckets in seconds, from cache hits up to slow rippled / Supabase calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_metrics = []
+_caches = {}
+_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _register(self)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram, one series per label combination."""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+        _register(self)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Per-bucket (non-cumulative) counts, plus one overflow slot, then sum
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, list(counts), total) for labels, (counts, total) in self._series.items())
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = _labels(self.labelnames, labels, [("le", _number(bound))])
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+def _register(metric):
+    with _lock:
+        _metrics.append(metric)
+
+
+def register_cache(name, cache):
+    """Exposes a cache's stats() (hits, misses, size, hit_ratio) under cache="name"."""
+    with _lock:
+        _caches[name] = cache
+
+
+def _collect_caches():
+    with _lock:
+        caches = sorted(_caches.items())
+    stats = [(name, cache.stats()) for name, cache in caches]
+    families = (
+        ("riverr_cache_hits_total", "counter", "Cache lookups served from memory.", "hits"),
+        ("riverr_cache_misses_total", "counter", "Cache lookups that fell through to the backing store.", "misses"),
+        ("riverr_cache_hit_ratio", "gauge", "Hits over lookups since process start.", "hit_ratio"),
+        ("riverr_cache_entries", "gauge", "Entries currently held.", "size"),
+    )
+    lines = []
+    for metric, kind, documentation, field in families:
+        lines += [f"# HELP {metric} {documentation}", f"# TYPE {metric} {kind}"]
+        for name, values in stats:
+            lines.append(f'{metric}{{cache="{_escape(name)}"}} {_number(values[field])}')
+    return lines
+
+
+def render():
+    """Returns every registered metric in Prometheus text format."""
+    with _lock:
+        metrics = list(_metrics)
+    lines = []
+    for metric in metrics:
+        lines += metric.collect()
+    lines += _collect_caches()
+    return "\n".join(lines) + "\n"
+
+
+# --- Application metrics ---
+
+http_request_duration = Histogram(
+    "riverr_http_request_duration_seconds", "Time spent handling a request, by route.", ("route", "method"))
+http_requests = Counter(
+    "riverr_http_requests_total", "Requests handled, by route and status code.", ("route", "method", "status"))
+http_errors = Counter(
+    "riverr_http_request_errors_total", "Requests that ended in a 5xx response.", ("route", "method"))
+
+upstream_duration = Histogram(
+    "riverr_upstream_duration_seconds", "Time spent waiting on rippled, Supabase or bcrypt.",
+    ("upstream", "operation"))
+upstream_requests = Counter(
+    "riverr_upstream_requests_total", "Calls made to an upstream.", ("upstream", "operation"))
+upstream_errors = Counter(
+    "riverr_upstream_errors_total", "Upstream calls that raised or returned an error.", ("upstream", "operation"))
+
+
+@contextmanager
+def track(upstream, operation):
+    """
+    Times one upstream call. The body may call the yielded function to mark the
+    call as failed without raising (e.g. a rippled error response).
+    """
+    failed = []
+    start = time.perf_counter()
+    try:
+        yield lambda: failed.append(True)
+    except BaseException:
+        failed.append(True)
+        raise
+    finally:
+        upstream_duration.observe(time.perf_counter() - start, upstream, operation)
+        upstream_requests.inc(upstream, operation)
+        if failed:
+            upstream_errors.inc(upstream, operation)
+
+
+def observe_request(route, method, status, elapsed):
+    http_request_duration.observe(elapsed, route, method)
+    http_requests.inc(route, method, str(status))
+    if status >= 500:
+        http_errors.inc(route, method)
+
+
+# PostgREST verbs, so Supabase calls read as users.select / listings.update
+_POSTGREST_OPERATIONS = {"GET": "select", "HEAD": "select", "POST": "insert", "PATCH": "update", "DELETE": "delete"}
+
+
+def postgrest_operation(request):
+    table = request.url.path.rstrip("/").rsplit("/", 1)[-1] or "root"
+    verb = _POSTGREST_OPERATIONS.get(request.method, request.method.lower())
+    if verb == "insert" and "merge-duplicates" in request.headers.get("prefer", ""):
+        verb = "upsert"
+    return f"{table}.{verb}"
+
+
+class InstrumentedTransport(httpx.BaseTransport):
+    """httpx transport wrapper that tracks every call as upstream / operation(request)."""
+
+    def __init__(self, inner, upstream, operation):
+        self.inner = inner
+        self.upstream = upstream
+        self.operation = operation
+
+    def handle_request(self, request):
+        with track(self.upstream, self.operation(request)) as fail:
+            response = self.inner.handle_request(request)
+            if response.status_code >= 400:
+                fail()
+            return response
+
+    def close(self):
+        self.inner.close()
+
+
+def init_app(app):
+    """Records per-route latency and status for every request a Flask app serves."""
+    from flask import g, request
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        start = g.pop("metrics_start", None)
+        if start is not None:
+            # Route templates (/jobs/<job_id>) keep label cardinality bounded
+            route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            observe_request(route, request.method, response.status_code, time.perf_counter() - start)
+        return response
@@ -0,0 +1,93 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+
+import metrics
+
+# bcrypt work factor for new hashes; stored hashes with a different cost are rehashed at login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+
+class PasswordServiceBusy(Exception):
+    pass
+
+
+def _to_bytes(value):
+    return value if isinstance(value, bytes) else value.encode("utf-8")
+
+
+def _hashpw(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _checkpw(password, hashed):
+    return bcrypt.checkpw(password, hashed)
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt in a process pool so logins don't hold Flask worker threads on CPU.
+
+    At most workers + max_queue operations are admitted at once; a caller that
+    can't get a slot within `wait` seconds gets PasswordServiceBusy instead of
+    queueing without bound. workers=0 hashes inline (for scripts).
+    """
+
+    def __init__(self, workers=None, max_queue=64, rounds=BCRYPT_ROUNDS, wait=2.0):
+        self.workers = os.cpu_count() if workers is None else workers
+        self.rounds = rounds
+        self.wait = wait
+        self._slots = threading.BoundedSemaphore(max(self.workers, 1) + max_queue)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                # By now the process has httpx pools, the ledger stream and request threads; forking it
+                # could leave children stuck on inherited locks, so workers start from a clean server
+                if "forkserver" in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context("forkserver")
+                    context.set_forkserver_preload([__name__])
+                else:
+                    context = multiprocessing.get_context("spawn")
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            return self._pool
+
+    def _run(self, operation, fn, *args):
+        # Timed from admission, so queueing for a slot or a pool worker shows up as bcrypt latency
+        with metrics.track("bcrypt", operation):
+            if not self._slots.acquire(timeout=self.wait):
+                raise PasswordServiceBusy("Password service is overloaded, try again shortly")
+            try:
+                if not self.workers:
+                    return fn(*args)
+                return self._get_pool().submit(fn, *args).result()
+            finally:
+                self._slots.release()
+
+    def hash_password(self, password):
+        return self._run("hash", _hashpw, _to_bytes(password), self.rounds).decode("utf-8")
+
+    def check_password(self, password, hashed):
+        return self._run("check", _checkpw, _to_bytes(password), _to_bytes(hashed))
+
+    def needs_rehash(self, hashed):
+        # bcrypt hashes look like $2b$<cost>$<salt+hash>
+        try:
+            return int(_to_bytes(hashed).split(b"$")[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+
+hasher = PasswordHasher(
+    workers=int(os.environ["PASSWORD_WORKERS"]) if os.getenv("PASSWORD_WORKERS") else None,
+    max_queue=int(os.getenv("PASSWORD_MAX_QUEUE", "64")),
+)
+
+hash_password = hasher.hash_password
+check_password = hasher.check_password
+needs_rehash = hasher.needs_rehash
@@ -0,0 +1,220 @@
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame):
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+def _thread_cpu_clock(thread_id):
+    try:
+        return time.pthread_getcpuclockid(thread_id)
+    except (AttributeError, OSError):
+        return None
+
+
+class Profile:
+    """
+    Stack samples for one request.
+
+    wall counts one sample per interval wherever the thread was, so it includes
+    time blocked on rippled or Supabase. cpu weights each sample by the
+    microseconds of CPU the thread burned since the previous one, so it only
+    shows where we were actually computing.
+    """
+
+    def __init__(self, method, path, interval):
+        self.id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.interval = interval
+        self.started_at = time.time()
+        self.wall_seconds = None
+        self.cpu_seconds = None
+        self.status = None
+        self.wall = Counter()
+        self.cpu = Counter()
+
+    def collapsed(self, kind="wall"):
+        """Folded stacks ("a;b;c <weight>" per line), the input format for flamegraph.pl / speedscope."""
+        stacks = self.cpu if kind == "cpu" else self.wall
+        return "".join(f"{stack} {weight}\n" for stack, weight in stacks.most_common())
+
+    def summary(self):
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "started_at": self.started_at,
+            "wall_seconds": self.wall_seconds,
+            "cpu_seconds": self.cpu_seconds,
+            "samples": sum(self.wall.values()),
+        }
+
+
+class _Sampler:
+    def __init__(self, profile, thread_id):
+        self.profile = profile
+        self.thread_id = thread_id
+        self.clock = _thread_cpu_clock(thread_id)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.thread_time()
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        # Runs on the request thread, so thread_time() is that thread's own CPU time
+        self.profile.cpu_seconds = time.thread_time() - self._start_cpu
+        self.profile.wall_seconds = time.perf_counter() - self._start_wall
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        last_cpu = time.clock_gettime(self.clock) if self.clock is not None else None
+        while not self._stop.wait(self.profile.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            stack = _collapse(frame)
+            del frame
+            self.profile.wall[stack] += 1
+            if last_cpu is not None:
+                cpu = time.clock_gettime(self.clock)
+                used = int((cpu - last_cpu) * 1_000_000)
+                if used > 0:
+                    self.profile.cpu[stack] += used
+                last_cpu = cpu
+
+
+class RequestProfiler:
+    """
+    Opt-in per-request sampling profiler.
+
+    A request is profiled when a sample_rate coin flip says so, or when it
+    carries X-Profile: <token> matching PROFILE_TOKEN. While profiled, a
+    sampler thread reads the request thread's stack every interval seconds.
+    The last `keep` profiles stay in memory, and are also written to
+    `directory` as .wall.folded / .cpu.folded files when it is set. With a
+    zero sample rate and no header a request costs one header lookup.
+    """
+
+    def __init__(self, sample_rate=0.0, token=None, interval=0.005, keep=50, max_active=4, directory=None):
+        self.sample_rate = sample_rate
+        self.token = token
+        self.interval = interval
+        self.keep = keep
+        self.directory = directory
+        self._profiles = OrderedDict()
+        self._active = threading.BoundedSemaphore(max_active)
+        self._lock = threading.Lock()
+
+    def is_admin(self, token):
+        # Compared as bytes: compare_digest raises TypeError on non-ASCII str
+        return bool(self.token) and bool(token) and hmac.compare_digest(token.encode(), self.token.encode())
+
+    def should_profile(self, header):
+        if header is not None and self.is_admin(header):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self, method, path):
+        """Starts sampling the calling thread; returns None if too many requests are already profiled."""
+        if not self._active.acquire(blocking=False):
+            return None
+        sampler = _Sampler(Profile(method, path, self.interval), threading.get_ident())
+        sampler.start()
+        return sampler
+
+    def finish(self, sampler, status):
+        try:
+            sampler.stop()
+        finally:
+            self._active.release()
+        profile = sampler.profile
+        profile.status = status
+        with self._lock:
+            self._profiles[profile.id] = profile
+            while len(self._profiles) > self.keep:
+                self._profiles.popitem(last=False)
+        if self.directory:
+            self._write(profile)
+        return profile
+
+    def _write(self, profile):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            for kind in ("wall", "cpu"):
+                with open(os.path.join(self.directory, f"{profile.id}.{kind}.folded"), "w") as f:
+                    f.write(profile.collapsed(kind))
+        except OSError as e:
+            print(f"Could not write profile {profile.id}: {e}")
+
+    def get(self, profile_id):
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def list(self):
+        with self._lock:
+            return [profile.summary() for profile in reversed(self._profiles.values())]
+
+
+profiler = RequestProfiler(
+    sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+    token=os.getenv("PROFILE_TOKEN"),
+    interval=float(os.getenv("PROFILE_INTERVAL", "0.005")),
+    keep=int(os.getenv("PROFILE_KEEP", "50")),
+    directory=os.getenv("PROFILE_DIR"),
+)
+
+
+def init_app(app):
+    """Profiles sampled or X-Profile-tagged requests to a Flask app."""
+    from flask import g, request
+
+    @app.before_request
+    def _start_profile():
+        if request.path.startswith("/debug/"):
+            return
+        if profiler.should_profile(request.headers.get(PROFILE_HEADER)):
+            g.profile_sampler = profiler.start(request.method, request.path)
+
+    @app.after_request
+    def _finish_profile(response):
+        sampler = g.pop("profile_sampler", None)
+        if sampler is not None:
+            profile = profiler.finish(sampler, response.status_code)
+            response.headers[PROFILE_ID_HEADER] = profile.id
+        return response
+
+    @app.teardown_request
+    def _abandon_profile(exc):
+        # after_request is skipped if an earlier hook raised; still stop the sampler
+        sampler = g.pop("profile_sampler", None)
+        if sampler is not None:
+            profiler.finish(sampler, 500)
@@ -0,0 +1,153 @@
+import os
+import threading
+import time
+
+import database
+import supa
+
+
+class Replica:
+    """
+    Keeps database.py's replica_users / replica_listings tables in step with Supabase.
+
+    Each table is loaded in full on the first pass (keyset pages on its primary
+    key), then polled every interval seconds for rows whose (updated_at, key)
+    is past the stored watermark. Hard deletes and rows committed with an
+    updated_at older than the watermark are invisible to the poll, so every
+    table is also fully resynced every full_sync_interval seconds. Writes made
+    through db.py are applied locally as soon as Supabase returns them.
+
+    Both Supabase tables need an updated_at column kept current by a trigger.
+    """
+
+    def __init__(self, interval=2.0, batch_size=1000, full_sync_interval=300.0):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.full_sync_interval = full_sync_interval
+        self.ready = threading.Event()
+        # Bumped whenever a table's local rows change, so callers can key caches on it
+        self.generations = {table: 0 for table in database.REPLICA_TABLES}
+        self._generation_lock = threading.Lock()
+        self._last_full_sync = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="supabase-replica", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Replica sync error: {e}")
+            self._stop.wait(self.interval)
+
+    def run_once(self):
+        """Brings every replicated table up to date. Returns the number of rows applied."""
+        applied = 0
+        for table in database.REPLICA_TABLES:
+            last_full_sync = self._last_full_sync.get(table)
+            if last_full_sync is None or time.monotonic() - last_full_sync >= self.full_sync_interval:
+                applied += self.full_sync(table)
+                self._last_full_sync[table] = time.monotonic()
+            else:
+                applied += self.poll(table)
+        self.ready.set()
+        return applied
+
+    def full_sync(self, table):
+        key, _ = database.REPLICA_TABLES[table]
+        rows = []
+        last = None
+        while True:
+            query = supa.db.table(table).select("*").order(key).limit(self.batch_size)
+            if last is not None:
+                query = query.gt(key, last)
+            page = query.execute().data
+            rows.extend(page)
+            if len(page) < self.batch_size:
+                break
+            last = page[-1][key]
+
+        stamped = [row for row in rows if row.get("updated_at")]
+        newest = max(stamped, key=lambda row: (row["updated_at"], row[key]), default=None)
+        database.replica_replace(
+            table, rows,
+            newest["updated_at"] if newest else None,
+            newest[key] if newest else None,
+        )
+        self._bump(table)
+        return len(rows)
+
+    def poll(self, table):
+        key, _ = database.REPLICA_TABLES[table]
+        updated_at, last_key = database.replica_watermark(table) or (None, None)
+        applied = 0
+        while True:
+            page = self._changes(table, key, updated_at, last_key)
+            if not page:
+                return applied
+            updated_at, last_key = page[-1]["updated_at"], page[-1][key]
+            database.replica_apply_changes(table, page, updated_at, last_key)
+            self._bump(table)
+            applied += len(page)
+
+    def _changes(self, table, key, updated_at, last_key):
+        # Rows stamped with the watermark's own updated_at that come after its key...
+        if updated_at is not None:
+            ties = (supa.db.table(table).select("*")
+                    .eq("updated_at", updated_at).gt(key, last_key)
+                    .order(key).limit(self.batch_size).execute().data)
+            if ties:
+                return ties
+        # ...then everything newer, oldest first
+        query = supa.db.table(table).select("*").order("updated_at").order(key).limit(self.batch_size)
+        if updated_at is None:
+            query = query.not_.is_("updated_at", "null")
+        else:
+            query = query.gt("updated_at", updated_at)
+        return query.execute().data
+
+    def _bump(self, table):
+        with self._generation_lock:
+            self.generations[table] += 1
+
+    def apply(self, table, rows):
+        # Read-your-writes for this process; the poll converges on the same rows anyway
+        if rows:
+            database.replica_upsert(table, rows)
+            self._bump(table)
+
+    def remove(self, table, keys):
+        if keys:
+            database.replica_delete(table, keys)
+            self._bump(table)
+
+
+replica = None
+
+
+def start_replica():
+    global replica
+    if replica is None:
+        replica = Replica(
+            interval=float(os.getenv("REPLICA_POLL_INTERVAL", "2")),
+            batch_size=int(os.getenv("REPLICA_BATCH_SIZE", "1000")),
+            full_sync_interval=float(os.getenv("REPLICA_FULL_SYNC_INTERVAL", "300")),
+        )
+        replica.start()
+    return replica
+
+
+def active_replica():
+    """Returns the replica once its first sync has finished, otherwise None."""
+    if replica is not None and replica.ready.is_set():
+        return replica
+    return None
@@ -0,0 +1,276 @@
+# Local autofill for transactions signed by our own wallets.
+#
+# xrpl-py's autofill_and_sign asks rippled for server_info, account_info, fee
+# and the validated ledger before every signature. A TransactionPreparer keeps
+# the wallet's next sequence in memory and shares short-lived fee / ledger
+# readings per client, so signing normally needs no RPC at all. The sequence is
+# only re-read from rippled after a submission comes back tefPAST_SEQ or
+# terPRE_SEQ, i.e. when the local count has drifted from the ledger.
+import os
+import threading
+import time
+
+from xrpl import XRPLException
+from xrpl.ledger import get_fee
+from xrpl.models.requests import AccountInfo, Ledger, SubmitOnly, Tx
+from xrpl.models.transactions import Transaction
+from xrpl.models.transactions.types import TransactionType
+from xrpl.transaction import XRPLReliableSubmissionException, autofill, sign
+from xrpl.transaction import submit_and_wait as xrpl_submit_and_wait
+
+import metrics
+
+# Same LastLedgerSequence headroom xrpl-py's autofill gives
+LEDGER_OFFSET = 20
+FEE_TTL = float(os.getenv("AUTOFILL_FEE_TTL", "10"))
+LEDGER_TTL = float(os.getenv("AUTOFILL_LEDGER_TTL", "3"))
+# Submit results that mean our local sequence no longer matches the account
+RESYNC_RESULTS = ("tefPAST_SEQ", "terPRE_SEQ")
+# Transaction types whose fee isn't the network base fee; these still go through xrpl-py's autofill
+SPECIAL_FEE_TYPES = (
+    TransactionType.ACCOUNT_DELETE,
+    TransactionType.AMM_CREATE,
+    TransactionType.ESCROW_FINISH,
+    TransactionType.BATCH,
+)
+# Fields dropped before re-signing a transaction with a fresh sequence
+_SIGNING_FIELDS = ("sequence", "last_ledger_sequence", "txn_signature", "signing_pub_key")
+
+resyncs = metrics.Counter(
+    "riverr_autofill_resyncs_total", "Local sequence counters re-read from rippled, by result.", ("result",))
+
+
+class NetworkState:
+    """Open-ledger fee and validated ledger index for one client, each re-read after its TTL."""
+
+    def __init__(self, client, fee_ttl=FEE_TTL, ledger_ttl=LEDGER_TTL):
+        self.client = client
+        self.fee_ttl = fee_ttl
+        self.ledger_ttl = ledger_ttl
+        self._fee = (None, 0.0)
+        self._ledger_index = (None, 0.0)
+        self._lock = threading.Lock()
+
+    def fee(self):
+        with self._lock:
+            value, read_at = self._fee
+            if value is not None and time.monotonic() - read_at < self.fee_ttl:
+                return value
+        value = get_fee(self.client)
+        with self._lock:
+            self._fee = (value, time.monotonic())
+        return value
+
+    def ledger_index(self):
+        with self._lock:
+            value, read_at = self._ledger_index
+            if value is not None and time.monotonic() - read_at < self.ledger_ttl:
+                return value
+        return self.refresh_ledger_index()
+
+    def refresh_ledger_index(self):
+        value = self.client.request(Ledger(ledger_index="validated")).result["ledger_index"]
+        with self._lock:
+            self._ledger_index = (value, time.monotonic())
+        return value
+
+
+class TransactionPreparer:
+    """
+    Fills Sequence, Fee and LastLedgerSequence for one wallet without asking rippled.
+
+    The first transaction reads the account's sequence from the current
+    ledger; after that each prepared transaction takes the next number. Every
+    transaction this wallet signs must go through the same preparer (see
+    get_preparer), otherwise the local count drifts and the next submission
+    comes back tefPAST_SEQ and triggers a resync.
+    """
+
+    def __init__(self, wallet, client, network=None, ledger_offset=LEDGER_OFFSET):
+        self.wallet = wallet
+        self.address = wallet.classic_address
+        self.client = client
+        self.network = network or NetworkState(client)
+        self.ledger_offset = ledger_offset
+        self._sequence = None
+        self._lock = threading.Lock()
+
+    def _account_sequence(self):
+        response = self.client.request(AccountInfo(account=self.address, ledger_index="current"))
+        if not response.is_successful():
+            raise XRPLException(response.result.get("error_message") or response.result.get("error"))
+        return response.result["account_data"]["Sequence"]
+
+    def next_sequence(self):
+        with self._lock:
+            if self._sequence is None:
+                self._sequence = self._account_sequence()
+            sequence = self._sequence
+            self._sequence += 1
+            return sequence
+
+    def resync(self, result="manual"):
+        """Forgets the local sequence; the next transaction re-reads it from rippled."""
+        with self._lock:
+            self._sequence = None
+        resyncs.inc(result)
+
+    def autofill(self, transaction):
+        if transaction.account != self.address or transaction.transaction_type in SPECIAL_FEE_TYPES:
+            return autofill(transaction, self.client)
+        fields = transaction.to_dict()
+        if "sequence" not in fields and "ticket_sequence" not in fields:
+            fields["sequence"] = self.next_sequence()
+        fields.setdefault("sequence", 0)
+        fields.setdefault("fee", self.network.fee())
+        fields.setdefault("last_ledger_sequence", self.network.ledger_index() + self.ledger_offset)
+        return Transaction.from_dict(fields)
+
+    def sign(self, transaction):
+        """Drop-in for autofill_and_sign(transaction, client, wallet)."""
+        return sign(self.autofill(transaction), self.wallet)
+
+    def submit_and_wait(self, transaction, retries=2, poll_interval=1.0):
+        """
+        Signs (unless already signed), submits and waits for a validated result.
+
+        Behaves like xrpl.transaction.submit_and_wait, except that other tem /
+        tef results resync the sequence and raise straight away instead of
+        waiting out LastLedgerSequence, and sequence drift is recovered without
+        risking a second copy applying:
+
+        - terPRE_SEQ: rippled holds the blob and applies it once the gap fills,
+          so it is waited on until its LastLedgerSequence passes.
+        - tefPAST_SEQ: the blob itself may have used the sequence (an earlier
+          submit that timed out), so it is looked up by hash first.
+        - tefALREADY: rippled already has this exact blob; it is waited on.
+
+        Only once the old blob can no longer apply is the sequence resynced.
+        Transactions this call signed are then re-signed and resubmitted (up to
+        `retries` times); transactions passed in already signed raise instead,
+        so the caller's hash always matches what was submitted.
+
+        Returns:
+            Response: The validated tx response.
+        """
+        resign = not transaction.is_signed()
+        signed = self.sign(transaction) if resign else transaction
+        for attempt in range(retries + 1):
+            tx_hash = signed.get_hash()
+            result = self.client.request(SubmitOnly(tx_blob=signed.blob())).result
+            engine_result = result.get("engine_result")
+            if engine_result is None:
+                raise XRPLReliableSubmissionException(
+                    f"{result.get('error_message') or result.get('error')}; transaction {tx_hash} may still "
+                    f"apply until ledger {signed.last_ledger_sequence}, check it before resubmitting"
+                )
+            if engine_result == "tefPAST_SEQ" and self.client.request(Tx(transaction=tx_hash)).is_successful():
+                # This very blob took the sequence
+                return wait_for_validation(self.client, tx_hash, signed.last_ledger_sequence,
+                                           engine_result, poll_interval, self.network)
+            if engine_result.startswith("tem") or (
+                    engine_result.startswith("tef") and engine_result not in ("tefPAST_SEQ", "tefALREADY")):
+                # The blob can never apply, so its sequence stays unused; without a resync the
+                # next transaction would come back terPRE_SEQ and wait out its LastLedgerSequence
+                self.resync(engine_result)
+                raise XRPLReliableSubmissionException(f"{engine_result}: {result.get('engine_result_message')}")
+
+            # tefALREADY: rippled already holds this exact blob, so it is waited on like any other
+            if engine_result != "tefPAST_SEQ":
+                response = _wait(self.client, tx_hash, signed.last_ledger_sequence, poll_interval, self.network)
+                if response is not None:
+                    return response
+                if engine_result != "terPRE_SEQ":
+                    raise _expired(signed.last_ledger_sequence, engine_result)
+
+            # The old blob is not in a validated ledger and can no longer apply
+            self.resync(engine_result)
+            if not resign or attempt == retries:
+                raise XRPLReliableSubmissionException(
+                    f"{engine_result}: transaction {tx_hash} did not apply and can no longer apply "
+                    f"(sequence {signed.sequence} was out of step with the account)"
+                )
+            fields = {key: value for key, value in signed.to_dict().items() if key not in _SIGNING_FIELDS}
+            signed = self.sign(Transaction.from_dict(fields))
+
+
+def _wait(client, tx_hash, last_ledger_sequence, poll_interval=1.0, network=None):
+    """
+    Polls tx until it is in a validated ledger (returns the response) or
+    LastLedgerSequence has passed without it (returns None).
+    """
+    while True:
+        time.sleep(poll_interval)
+        # Ledger first: a tx missing after this read can't land in any ledger up to it
+        if network is not None:
+            validated_index = network.refresh_ledger_index()
+        else:
+            validated_index = client.request(Ledger(ledger_index="validated")).result["ledger_index"]
+        response = client.request(Tx(transaction=tx_hash))
+        if response.result.get("validated"):
+            return_code = response.result["meta"]["TransactionResult"]
+            if return_code != "tesSUCCESS":
+                raise XRPLReliableSubmissionException(f"Transaction failed: {return_code}")
+            return response
+        if not response.is_successful() and response.result.get("error") != "txnNotFound":
+            raise XRPLException(response.result.get("error_message") or response.result.get("error"))
+        if validated_index >= last_ledger_sequence:
+            return None
+
+
+def _expired(last_ledger_sequence, prelim_result):
+    return XRPLReliableSubmissionException(
+        f"LastLedgerSequence {last_ledger_sequence} passed without the transaction validating. "
+        f"Prelim result: {prelim_result}"
+    )
+
+
+def wait_for_validation(client, tx_hash, last_ledger_sequence, prelim_result, poll_interval=1.0, network=None):
+    """Polls tx until it is in a validated ledger; raises once LastLedgerSequence has passed."""
+    response = _wait(client, tx_hash, last_ledger_sequence, poll_interval, network)
+    if response is None:
+        raise _expired(last_ledger_sequence, prelim_result)
+    return response
+
+
+_preparers = {}
+_networks = {}
+_lock = threading.Lock()
+
+
+def get_preparer(wallet, client):
+    """Returns the process-wide preparer for wallet on client, creating it on first use."""
+    key = (wallet.classic_address, client)
+    with _lock:
+        preparer = _preparers.get(key)
+        if preparer is None:
+            network = _networks.get(client)
+            if network is None:
+                network = _networks[client] = NetworkState(client)
+            preparer = _preparers[key] = TransactionPreparer(wallet, client, network)
+        return preparer
+
+
+def resync(address, result="manual"):
+    """Resyncs every preparer signing for address, e.g. after a tefPAST_SEQ from another submit path."""
+    with _lock:
+        preparers = [preparer for (owner, _), preparer in _preparers.items() if owner == address]
+    for preparer in preparers:
+        preparer.resync(result)
+
+
+def submit_and_wait(transaction, client, wallet=None):
+    """
+    Drop-in for xrpl.transaction.submit_and_wait through the wallet's preparer.
+
+    An already signed transaction can be passed without a wallet; it then goes
+    through the preparer that signed it, or plain xrpl-py if there is none.
+    """
+    if wallet is None:
+        with _lock:
+            preparer = _preparers.get((transaction.account, client))
+        if preparer is None:
+            return xrpl_submit_and_wait(transaction, client)
+    else:
+        preparer = get_preparer(wallet, client)
+    return preparer.submit_and_wait(transaction)
@@ -0,0 +1,181 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from xrpl.core.binarycodec import decode
+from xrpl.models.requests import Ledger, SubmitOnly, Tx
+
+import database
+import signing
+import xrpl_registry
+
+# Engine result prefixes that mean the transaction may still make it into a ledger
+PENDING_RESULT_PREFIXES = ("tes", "ter", "tec")
+FINAL_STATUSES = ("validated", "failed", "expired")
+
+
+class QueueFull(Exception):
+    pass
+
+
+def transaction_hash(tx_blob):
+    # Hash of a signed transaction: SHA-512Half of "TXN\0" + blob
+    return hashlib.sha512(bytes.fromhex("54584E00" + tx_blob)).hexdigest()[:64].upper()
+
+
+class SubmissionQueue:
+    """
+    Asynchronous submission pipeline for signed transactions.
+
+    enqueue() returns a job id immediately. A small worker pool submits the
+    blobs without waiting, and a tracker thread checks every in-flight hash
+    once per poll interval, on its own executor so slow lookups never hold up
+    new submissions, until it is validated or its LastLedgerSequence has
+    passed (blobs without one are rejected). Job state lives in SQLite (see
+    database.py), so get() answers for jobs enqueued by any worker process;
+    each process tracks the jobs it submitted.
+    """
+
+    def __init__(self, client, workers=4, track_workers=4, max_in_flight=1000, poll_interval=1.0, retention=3600):
+        self.client = client
+        self.max_in_flight = max_in_flight
+        self.poll_interval = poll_interval
+        self.retention = retention
+        # job id -> (hash, last_ledger_sequence) for jobs this process has yet to settle
+        self._in_flight = {}
+        self._submitted = set()
+        self._pruned_at = 0.0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="xrpl-submit")
+        self._track_executor = ThreadPoolExecutor(max_workers=track_workers, thread_name_prefix="xrpl-track")
+        self._stop = threading.Event()
+        self._tracker = threading.Thread(target=self._track, name="xrpl-submit-tracker", daemon=True)
+        self._tracker.start()
+
+    def enqueue(self, tx_blob, owner=None):
+        decoded = decode(tx_blob)
+        if decoded.get("LastLedgerSequence") is None:
+            # Without it the tracker could never expire a blob that doesn't validate
+            raise ValueError("Transaction must set LastLedgerSequence")
+        now = time.time()
+        job = {
+            "id": uuid.uuid4().hex,
+            "owner": owner,
+            "status": "queued",
+            "hash": transaction_hash(tx_blob),
+            "last_ledger_sequence": decoded["LastLedgerSequence"],
+            "created_at": now,
+            "updated_at": now,
+        }
+        with self._lock:
+            if len(self._in_flight) >= self.max_in_flight:
+                raise QueueFull(f"{self.max_in_flight} submissions already in flight")
+            self._in_flight[job["id"]] = (job["hash"], job["last_ledger_sequence"])
+        try:
+            database.insert_job(job)
+        except Exception:
+            with self._lock:
+                self._in_flight.pop(job["id"], None)
+            raise
+        self._prune(now)
+        self._executor.submit(self._submit, job["id"], tx_blob, decoded.get("Account"))
+        return job["id"]
+
+    def get(self, job_id):
+        return database.get_job(job_id)
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": len(self._in_flight)}
+
+    def stop(self):
+        self._stop.set()
+        self._executor.shutdown(wait=False)
+        self._track_executor.shutdown(wait=False)
+
+    def _update(self, job_id, **fields):
+        database.update_job(job_id, updated_at=time.time(), **fields)
+        with self._lock:
+            if fields.get("status") == "submitted":
+                self._submitted.add(job_id)
+            elif fields.get("status") in FINAL_STATUSES:
+                self._in_flight.pop(job_id, None)
+                self._submitted.discard(job_id)
+
+    def _prune(self, now):
+        # Drop finished jobs past retention, at most once a minute
+        with self._lock:
+            if now - self._pruned_at < 60:
+                return
+            self._pruned_at = now
+        try:
+            database.prune_jobs(now - self.retention, FINAL_STATUSES)
+        except Exception as e:
+            print(f"Submission job prune failed: {e}")
+
+    def _submit(self, job_id, tx_blob, account=None):
+        try:
+            response = self.client.request(SubmitOnly(tx_blob=tx_blob))
+            engine_result = response.result.get("engine_result")
+            if engine_result in signing.RESYNC_RESULTS:
+                # Whoever signed this blob is out of step with the ledger
+                signing.resync(account, engine_result)
+            if engine_result and engine_result.startswith(PENDING_RESULT_PREFIXES):
+                self._update(job_id, status="submitted", engine_result=engine_result)
+            else:
+                self._update(
+                    job_id,
+                    status="failed",
+                    engine_result=engine_result,
+                    error=response.result.get("engine_result_message") or response.result.get("error_message")
+                    or response.result.get("error"),
+                )
+        except Exception as e:
+            try:
+                self._update(job_id, status="failed", error=str(e))
+            except Exception as e:
+                print(f"Submission job {job_id} could not be updated: {e}")
+                with self._lock:
+                    self._in_flight.pop(job_id, None)
+
+    def _track(self):
+        while not self._stop.wait(self.poll_interval):
+            with self._lock:
+                pending = [(job_id, *self._in_flight[job_id]) for job_id in self._submitted]
+            if not pending:
+                continue
+            try:
+                validated_index = self.client.request(Ledger(ledger_index="validated")).result["ledger_index"]
+                list(self._track_executor.map(lambda job: self._check(*job, validated_index), pending))
+            except Exception as e:
+                print(f"Submission tracker error: {e}")
+
+    def _check(self, job_id, tx_hash, last_ledger_sequence, validated_index):
+        result = self.client.request(Tx(transaction=tx_hash)).result
+        if result.get("validated"):
+            meta = result.get("meta") or {}
+            self._update(job_id, status="validated", result=meta.get("TransactionResult"),
+                         ledger_index=result.get("ledger_index"))
+        elif validated_index > last_ledger_sequence:
+            self._update(job_id, status="expired", error="LastLedgerSequence passed without validation")
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_queue():
+    """Returns the process-wide submission queue, starting it on first use."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = SubmissionQueue(
+                xrpl_registry.get_client(),
+                workers=int(os.getenv("SUBMIT_WORKERS", "4")),
+                track_workers=int(os.getenv("SUBMIT_TRACK_WORKERS", "4")),
+                max_in_flight=int(os.getenv("SUBMIT_MAX_IN_FLIGHT", "1000")),
+            )
+        return _queue
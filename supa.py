@@ -1,8 +1,40 @@
 from dotenv import load_dotenv
 import os
-from supabase import create_client, Client
+import threading
+import httpx
+
+import metrics
+import transport
 
 load_dotenv()
 url: str = os.getenv("NEXT_PUBLIC_SUPABASE_URL")
 key: str = os.getenv("NEXT_PUBLIC_SUPABASE_ANON_KEY")
-db: Client = create_client(url, key)
+
+_lock = threading.Lock()
+
+
+def create_db():
+    # supabase pulls in postgrest, gotrue, storage and realtime; import it only when first needed
+    from postgrest.constants import DEFAULT_POSTGREST_CLIENT_TIMEOUT
+    from supabase import create_client, ClientOptions
+
+    # Our own httpx client, so every PostgREST call is timed per table/verb and can go
+    # through the record/replay transport when RIVERR_TRANSPORT is set
+    http_client = httpx.Client(
+        timeout=DEFAULT_POSTGREST_CLIENT_TIMEOUT,
+        follow_redirects=True,
+        transport=metrics.InstrumentedTransport(
+            transport.wrap(httpx.HTTPTransport(http2=True)), "supabase", metrics.postgrest_operation,
+        ),
+    )
+    return create_client(url, key, options=ClientOptions(httpx_client=http_client))
+
+
+# supa.db is built on first access; after that it is a plain module attribute
+def __getattr__(name):
+    if name == "db":
+        with _lock:
+            if "db" not in globals():
+                globals()["db"] = create_db()
+            return globals()["db"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,4 +1,5 @@
 from xrpl_utilities import *
+from xrpl_utilities import client, wallet1, wallet2, wallet3
 
 # INJECTING CURRENCY
 # inject_issued_currency(
@@ -0,0 +1,269 @@
+import asyncio
+import atexit
+import base64
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# RIVERR_TRANSPORT=record captures every XRPL / Supabase HTTP exchange to RIVERR_TRANSPORT_LOG;
+# RIVERR_TRANSPORT=replay serves them back from that log without touching the network.
+MODES = ("record", "replay")
+DEFAULT_LOG_PATH = "transport_log.jsonl.gz"
+
+# Headers that describe the wire encoding rather than the body we store
+_WIRE_HEADERS = ("content-encoding", "content-length", "transfer-encoding", "connection", "keep-alive")
+
+
+def _rpc_method(body):
+    # JSON-RPC method name ("account_info", ...) for rippled calls, None for everything else
+    try:
+        payload = json.loads(body)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    return payload.get("method") if isinstance(payload, dict) else None
+
+
+def _target(request):
+    return request.url.raw_path.decode("ascii")
+
+
+def request_key(request, body):
+    """Exact match key: method, path + query and a digest of the request body."""
+    return "{} {} {}".format(request.method, _target(request), hashlib.sha1(body).hexdigest()[:16])
+
+
+def loose_key(request, body):
+    """Fallback key: method, path without query and the JSON-RPC method if there is one."""
+    return "{} {} {}".format(request.method, request.url.path, _rpc_method(body) or "")
+
+
+def _encode_body(content):
+    try:
+        return {"body": content.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"body_b64": base64.b64encode(content).decode("ascii")}
+
+
+def _decode_body(entry):
+    if "body_b64" in entry:
+        return base64.b64decode(entry["body_b64"])
+    return entry.get("body", "").encode("utf-8")
+
+
+def _clean_headers(headers):
+    return [(name, value) for name, value in headers.items() if name.lower() not in _WIRE_HEADERS]
+
+
+class TransportLog:
+    """
+    Append-only gzip JSONL log of HTTP exchanges.
+
+    Each line holds the request keys, status, headers, decoded body and the
+    upstream time in seconds. Replays hand out the responses recorded for a key
+    in their original order, starting over once a key's responses run out, so
+    a benchmark loop can run for longer than the recording.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+        self._exact = {}
+        self._loose = {}
+
+    def append(self, entry):
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = gzip.open(self.path, "at", encoding="utf-8")
+            self._file.write(line)
+            self._file.flush()
+
+    def load(self):
+        with self._lock:
+            self._exact.clear()
+            self._loose.clear()
+            if not os.path.exists(self.path):
+                return 0
+            count = 0
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                try:
+                    for line in f:
+                        if not line.endswith("\n"):
+                            break
+                        entry = json.loads(line)
+                        self._exact.setdefault(entry["key"], deque()).append(entry)
+                        self._loose.setdefault(entry["loose_key"], deque()).append(entry)
+                        count += 1
+                except EOFError:
+                    # A recorder that was killed never wrote the gzip trailer; keep what was flushed
+                    pass
+            return count
+
+    def lookup(self, key, loose):
+        with self._lock:
+            entries = self._exact.get(key) or self._loose.get(loose)
+            if not entries:
+                return None
+            entry = entries[0]
+            entries.rotate(-1)
+            return entry
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def _record(log, request, response, content, elapsed):
+    body = request.content
+    log.append({
+        "key": request_key(request, body),
+        "loose_key": loose_key(request, body),
+        "method": request.method,
+        "target": _target(request),
+        "status": response.status_code,
+        "headers": _clean_headers(response.headers),
+        "elapsed": round(elapsed, 6),
+        **_encode_body(content),
+    })
+    return httpx.Response(response.status_code, headers=_clean_headers(response.headers), content=content,
+                          request=request)
+
+
+def _replay(log, request):
+    body = request.content
+    entry = log.lookup(request_key(request, body), loose_key(request, body))
+    if entry is None:
+        raise httpx.ConnectError(f"No recorded response for {request.method} {_target(request)}", request=request)
+    response = httpx.Response(entry["status"], headers=entry["headers"], content=_decode_body(entry),
+                              request=request)
+    return entry, response
+
+
+class RecordingTransport(httpx.BaseTransport):
+    def __init__(self, inner, log):
+        self.inner = inner
+        self.log = log
+
+    def handle_request(self, request):
+        request.read()
+        start = time.perf_counter()
+        response = self.inner.handle_request(request)
+        try:
+            content = response.read()
+        finally:
+            response.close()
+        return _record(self.log, request, response, content, time.perf_counter() - start)
+
+    def close(self):
+        self.inner.close()
+
+
+class AsyncRecordingTransport(httpx.AsyncBaseTransport):
+    def __init__(self, inner, log):
+        self.inner = inner
+        self.log = log
+
+    async def handle_async_request(self, request):
+        await request.aread()
+        start = time.perf_counter()
+        response = await self.inner.handle_async_request(request)
+        try:
+            content = await response.aread()
+        finally:
+            await response.aclose()
+        return _record(self.log, request, response, content, time.perf_counter() - start)
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+
+class ReplayTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """
+    Serves recorded responses instead of calling upstream.
+
+    latency is a fixed delay in seconds added to every response, or
+    "recorded" to sleep for as long as the original call took.
+    """
+
+    def __init__(self, log, latency=0.0):
+        self.log = log
+        self.latency = latency
+
+    def _delay(self, entry):
+        if self.latency == "recorded":
+            return entry.get("elapsed", 0.0)
+        return self.latency
+
+    def handle_request(self, request):
+        request.read()
+        entry, response = _replay(self.log, request)
+        delay = self._delay(entry)
+        if delay:
+            time.sleep(delay)
+        return response
+
+    async def handle_async_request(self, request):
+        await request.aread()
+        entry, response = _replay(self.log, request)
+        delay = self._delay(entry)
+        if delay:
+            await asyncio.sleep(delay)
+        return response
+
+
+_log = None
+_log_lock = threading.Lock()
+
+
+def get_mode():
+    mode = (os.getenv("RIVERR_TRANSPORT") or "").lower()
+    return mode if mode in MODES else None
+
+
+def get_replay_latency():
+    value = os.getenv("RIVERR_REPLAY_LATENCY") or "0"
+    return value if value == "recorded" else float(value)
+
+
+def get_log():
+    """Returns the process-wide transport log, loading it for replay on first use."""
+    global _log
+    with _log_lock:
+        if _log is None:
+            _log = TransportLog(os.getenv("RIVERR_TRANSPORT_LOG") or DEFAULT_LOG_PATH)
+            if get_mode() == "replay":
+                _log.load()
+            atexit.register(_log.close)
+        return _log
+
+
+def wrap(inner):
+    """Wraps a sync httpx transport for the configured mode (or returns it unchanged)."""
+    mode = get_mode()
+    if mode == "record":
+        return RecordingTransport(inner, get_log())
+    if mode == "replay":
+        return ReplayTransport(get_log(), get_replay_latency())
+    return inner
+
+
+def async_wrap(inner):
+    """Async counterpart of wrap()."""
+    mode = get_mode()
+    if mode == "record":
+        return AsyncRecordingTransport(inner, get_log())
+    if mode == "replay":
+        return ReplayTransport(get_log(), get_replay_latency())
+    return inner
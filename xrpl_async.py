@@ -0,0 +1,118 @@
+# Async counterparts of the xrpl_utilities read helpers, used by the asyncio serving mode (asgi.py)
+import asyncio
+
+from xrpl import XRPLException
+from xrpl.models.requests import AccountInfo, AccountLines, AccountTx, Ledger
+
+import xrpl_registry
+import xrpl_utilities
+from xrpl_utilities import MAX_BATCH_ADDRESSES, Transaction, TrustLineAnalytics
+
+# Shares the ledger-keyed cache with the sync code paths
+account_cache = xrpl_utilities.account_cache
+
+# Upper bound on concurrent rippled requests from one batch call
+BATCH_CONCURRENCY = 64
+
+
+def get_client():
+    return xrpl_registry.get_async_client()
+
+
+async def _request(request):
+    response = await get_client().request(request)
+    if not response.is_successful():
+        raise XRPLException(response.result.get("error_message") or response.result.get("error"))
+    return response.result
+
+
+#Validated Ledger Index
+async def get_validated_ledger_index():
+    ledger_index = account_cache.validated_ledger_index()
+    if ledger_index is None:
+        ledger_index = (await _request(Ledger(ledger_index="validated")))["ledger_index"]
+        account_cache.advance(ledger_index)
+    return ledger_index
+
+
+#Account Info
+async def get_account_info(address):
+    ledger_index = await get_validated_ledger_index()
+    account_data = account_cache.get(address, ledger_index)
+    if account_data is not None:
+        return account_data
+
+    result = await _request(AccountInfo(account=address, ledger_index=ledger_index, strict=True))
+    account_data = result["account_data"]
+    account_cache.put(address, ledger_index, account_data)
+    return account_data
+
+
+#Get Account Balance in XRP
+async def get_balance(address):
+    return float((await get_account_info(address))["Balance"]) / 1000000
+
+
+#Account Info for many addresses at once
+async def get_account_info_batch(addresses):
+    addresses = list(dict.fromkeys(addresses))
+    if len(addresses) > MAX_BATCH_ADDRESSES:
+        raise ValueError(f"At most {MAX_BATCH_ADDRESSES} addresses per batch")
+
+    await get_validated_ledger_index()
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def fetch(address):
+        async with semaphore:
+            return await get_account_info(address)
+
+    outcomes = await asyncio.gather(*(fetch(address) for address in addresses), return_exceptions=True)
+    results, errors = {}, {}
+    for address, outcome in zip(addresses, outcomes):
+        if isinstance(outcome, Exception):
+            errors[address] = str(outcome)
+        else:
+            results[address] = outcome
+    return results, errors
+
+
+#Trustlines
+async def get_trustlines(address, page_size=400):
+    lines = []
+    marker = None
+    while True:
+        response = await get_client().request(AccountLines(account=address, limit=page_size, marker=marker))
+        lines.extend(response.result.get("lines", []))
+        marker = response.result.get("marker")
+        if not marker:
+            return lines
+
+
+async def summarize_trustlines(address):
+    lines = await get_trustlines(address)
+    # The aggregation is CPU-bound; keep it off the event loop
+    return await asyncio.to_thread(TrustLineAnalytics.summarize_lines, lines)
+
+
+#Transaction History
+async def get_transaction_history_page(address, limit=10, cursor=None):
+    result = await _request(AccountTx(
+        account=address,
+        ledger_index_min=-1,
+        ledger_index_max=-1,
+        limit=limit,
+        binary=False,
+        forward=False,
+        marker=Transaction.decode_ledger_cursor(cursor),
+    ))
+    return result.get("transactions", []), Transaction.encode_cursor(result.get("marker"))
+
+
+async def iter_transaction_history(address, page_size=200):
+    cursor = None
+    while True:
+        transactions, cursor = await get_transaction_history_page(address, page_size, cursor)
+        for transaction in transactions:
+            yield transaction
+        if not cursor:
+            break
@@ -1,20 +1,26 @@
-from xrpl.clients import JsonRpcClient
 from xrpl.models import EscrowCreate, EscrowFinish
 from xrpl.transaction import submit_and_wait, XRPLReliableSubmissionException
 from xrpl.wallet import generate_faucet_wallet, Wallet
 from xrpl.utils import datetime_to_ripple_time
-from cryptoconditions import PreimageSha256
 from datetime import datetime
 import os
+import xrpl_registry
 
 class XRPLClient:
     def __generate_condition(self):
+        # Imported here: cryptoconditions is only needed for escrows and slows startup
+        from cryptoconditions import PreimageSha256
         randy = os.urandom(32)
         fullfillment = PreimageSha256(preimage=randy)
         return (fullfillment.condition_binary.hex().upper(), fullfillment.serialize_binary().hex().upper())
 
-    def __init__ (self, url):
-        self.client = JsonRpcClient(url)
+    def __init__ (self, url=None):
+        # Shared pooled client (defaults to JSON_RPC_URL), looked up on first use
+        self.url = url
+
+    @property
+    def client(self):
+        return xrpl_registry.get_client(self.url)
     
     def create_escrow_tx(self, sender: str, receiver: str, amount: int, cancel_after: int):
         # returns (tx, condition, fullfillment_serialized)
@@ -0,0 +1,181 @@
+import os
+import threading
+from json import JSONDecodeError
+
+import httpx
+from dotenv import load_dotenv
+from xrpl.asyncio.clients.client import REQUEST_TIMEOUT
+from xrpl.asyncio.clients.exceptions import XRPLRequestFailureException
+from xrpl.asyncio.clients.utils import json_to_response, request_to_json_rpc
+from xrpl.asyncio.clients import AsyncJsonRpcClient
+from xrpl.clients import JsonRpcClient
+from xrpl.wallet import Wallet
+
+import metrics
+import transport
+
+load_dotenv()
+
+DEFAULT_JSON_RPC_URL = "https://s.altnet.rippletest.net:51234/"
+DEFAULT_WEBSOCKET_URL = "wss://s.altnet.rippletest.net:51233/"
+
+# Env var holding the seed of each named wallet; issuer_wallet is the ETH issuer (wallet3)
+WALLET_SEEDS = {
+    "wallet1": "WALLET1_SEED",
+    "wallet2": "WALLET2_SEED",
+    "wallet3": "WALLET3_SEED",
+    "wallet4": "WALLET4_SEED",
+    "wallet5": "WALLET5_SEED",
+    "issuer_wallet": "WALLET3_SEED",
+}
+
+_clients = {}
+_async_clients = {}
+_wallets = {}
+_lock = threading.Lock()
+
+
+class MissingWalletSeed(Exception):
+    pass
+
+
+class PooledJsonRpcClient(JsonRpcClient):
+    """
+    JsonRpcClient that keeps a pool of keep-alive HTTP connections.
+
+    The stock client opens a fresh httpx.AsyncClient (and TCP/TLS session) for
+    every request. This one posts through a single thread-safe httpx.Client, both
+    for direct client.request() calls and for xrpl-py's async helpers such as
+    autofill_and_sign and submit_and_wait, which call _request_impl.
+    """
+
+    def __init__(self, url, pool_size=64, keepalive=16, timeout=REQUEST_TIMEOUT):
+        super().__init__(url)
+        # Limits go on the transport: httpx ignores Client(limits=) once a transport is given
+        self.http_client = httpx.Client(
+            timeout=timeout,
+            transport=transport.wrap(httpx.HTTPTransport(
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=keepalive),
+            )),
+        )
+
+    def request(self, request):
+        return self._post(request)
+
+    async def _request_impl(self, request, *, timeout=REQUEST_TIMEOUT):
+        return self._post(request, timeout)
+
+    def _post(self, request, timeout=REQUEST_TIMEOUT):
+        with metrics.track("rippled", request.method.value) as fail:
+            response = self.http_client.post(self.url, json=request_to_json_rpc(request), timeout=timeout)
+            try:
+                result = json_to_response(response.json())
+            except JSONDecodeError:
+                raise XRPLRequestFailureException(
+                    {
+                        "error": response.status_code,
+                        "error_message": response.text,
+                    }
+                )
+            if not result.is_successful():
+                fail()
+            return result
+
+    def close(self):
+        self.http_client.close()
+
+
+class PooledAsyncJsonRpcClient(AsyncJsonRpcClient):
+    """
+    AsyncJsonRpcClient that reuses one httpx.AsyncClient (and its keep-alive pool).
+
+    The HTTP client is created on first use so it binds to the serving event loop.
+    """
+
+    def __init__(self, url, pool_size=256, keepalive=64, timeout=REQUEST_TIMEOUT):
+        super().__init__(url)
+        self.limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=keepalive)
+        self.timeout = timeout
+        self.http_client = None
+
+    async def _request_impl(self, request, *, timeout=REQUEST_TIMEOUT):
+        if self.http_client is None:
+            self.http_client = httpx.AsyncClient(
+                timeout=self.timeout,
+                transport=transport.async_wrap(httpx.AsyncHTTPTransport(limits=self.limits)),
+            )
+        with metrics.track("rippled", request.method.value) as fail:
+            response = await self.http_client.post(self.url, json=request_to_json_rpc(request), timeout=timeout)
+            try:
+                result = json_to_response(response.json())
+            except JSONDecodeError:
+                raise XRPLRequestFailureException(
+                    {
+                        "error": response.status_code,
+                        "error_message": response.text,
+                    }
+                )
+            if not result.is_successful():
+                fail()
+            return result
+
+    async def close(self):
+        if self.http_client is not None:
+            await self.http_client.aclose()
+            self.http_client = None
+
+
+def get_json_rpc_url():
+    return os.getenv("JSON_RPC_URL") or DEFAULT_JSON_RPC_URL
+
+
+def get_websocket_url():
+    return os.getenv("XRPL_WS_URL") or DEFAULT_WEBSOCKET_URL
+
+
+def get_client(url=None):
+    """Returns the process-wide pooled client for url (defaults to JSON_RPC_URL)."""
+    url = url or get_json_rpc_url()
+    with _lock:
+        client = _clients.get(url)
+        if client is None:
+            client = _clients[url] = PooledJsonRpcClient(
+                url,
+                pool_size=int(os.getenv("XRPL_POOL_SIZE", "64")),
+                keepalive=int(os.getenv("XRPL_POOL_KEEPALIVE", "16")),
+            )
+        return client
+
+
+def get_async_client(url=None):
+    """Returns the process-wide pooled async client for url, for use from one event loop."""
+    url = url or get_json_rpc_url()
+    with _lock:
+        client = _async_clients.get(url)
+        if client is None:
+            client = _async_clients[url] = PooledAsyncJsonRpcClient(
+                url,
+                pool_size=int(os.getenv("XRPL_ASYNC_POOL_SIZE", "256")),
+                keepalive=int(os.getenv("XRPL_ASYNC_POOL_KEEPALIVE", "64")),
+            )
+        return client
+
+
+def get_wallet(name):
+    """Derives the named wallet (see WALLET_SEEDS) on first use and reuses it afterwards."""
+    variable = WALLET_SEEDS[name]
+    with _lock:
+        wallet = _wallets.get(variable)
+        if wallet is None:
+            seed = os.getenv(variable)
+            if not seed:
+                raise MissingWalletSeed(f"{variable} is not set")
+            wallet = _wallets[variable] = Wallet.from_seed(seed)
+        return wallet
+
+
+def close_clients():
+    with _lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
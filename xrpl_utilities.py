@@ -2,46 +2,119 @@ from xrpl.clients import JsonRpcClient
 from xrpl.models.requests.account_info import AccountInfo
 from xrpl.models.transactions import TrustSet, TrustSetFlag, Payment, AccountSet, AccountSetFlag
 from xrpl.models.amounts import IssuedCurrencyAmount
-from xrpl.transaction import autofill_and_sign, submit_and_wait
-from xrpl.models.requests import AccountLines, AccountTx
+from xrpl.models.requests import AccountLines, AccountTx, Ledger
 from xrpl.wallet import Wallet, generate_faucet_wallet
 from xrpl import XRPLException
 
+import base64
 import json
 import xrpl
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 from dotenv import load_dotenv
+from caches import LedgerCache
+import metrics
+import signing
+import xrpl_registry
+import submission_queue
 
 import os 
 
 load_dotenv()
 
-wallet1 = Wallet.from_seed(os.getenv("WALLET1_SEED"))
-wallet2 = Wallet.from_seed(os.getenv("WALLET2_SEED"))
-wallet3 = Wallet.from_seed(os.getenv("WALLET3_SEED"))
-wallet4 = Wallet.from_seed(os.getenv("WALLET4_SEED"))
-wallet5 = Wallet.from_seed(os.getenv("WALLET5_SEED"))
-JSON_RPC_URL = "https://s.altnet.rippletest.net:51234/"
-client = JsonRpcClient(JSON_RPC_URL)
+JSON_RPC_URL = xrpl_registry.get_json_rpc_url()
+
+
+# wallet1..wallet5, issuer_wallet and client are created on first access rather than
+# at import, so importing this module derives no keys and works without every seed set
+def __getattr__(name):
+    if name in xrpl_registry.WALLET_SEEDS:
+        return xrpl_registry.get_wallet(name)
+    if name == "client":
+        return _client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _client():
+    return xrpl_registry.get_client(JSON_RPC_URL)
+
+# Shared read-through cache for account_info, keyed by validated ledger
+account_cache = LedgerCache(maxsize=int(os.getenv("ACCOUNT_CACHE_SIZE", "4096")))
+metrics.register_cache("account_info", account_cache)
+
+# Bounded pool for multi-address lookups
+MAX_BATCH_ADDRESSES = 500
+batch_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("BATCH_MAX_WORKERS", "64")),
+    thread_name_prefix="xrpl-batch",
+)
+
+#Validated Ledger Index
+def get_validated_ledger_index():
+    ledger_index = account_cache.validated_ledger_index()
+    if ledger_index is None:
+        response = _client().request(Ledger(ledger_index="validated"))
+        ledger_index = response.result["ledger_index"]
+        account_cache.advance(ledger_index)
+    return ledger_index
 
 #Account Info
 def get_account_info(address):
+    ledger_index = get_validated_ledger_index()
+    account_data = account_cache.get(address, ledger_index)
+    if account_data is not None:
+        return account_data
+
     acc_info = AccountInfo(
         account=address,
-        ledger_index="validated",
+        ledger_index=ledger_index,
         strict=True,
     )
-    response = client.request(acc_info)
+    response = _client().request(acc_info)
+    if not response.is_successful():
+        raise XRPLException(response.result.get("error_message") or response.result.get("error"))
     account_data = response.result["account_data"]
-    
+    account_cache.put(address, ledger_index, account_data)
+
     return account_data
 
 #Get Account Balance in XRP
 def get_balance(address):
     return float(get_account_info(address)["Balance"])/1000000
 
+#Account Info for many addresses at once
+def get_account_info_batch(addresses):
+    """
+    Fetches account info for several addresses concurrently.
+
+    Args:
+        addresses (list[str]): Classic addresses to look up (duplicates are fetched once).
+
+    Returns:
+        tuple[dict, dict]: (account_data by address, error message by address).
+    """
+    addresses = list(dict.fromkeys(addresses))
+    if len(addresses) > MAX_BATCH_ADDRESSES:
+        raise ValueError(f"At most {MAX_BATCH_ADDRESSES} addresses per batch")
+
+    # Resolve the ledger once so the workers all hit the same cache generation
+    get_validated_ledger_index()
+    futures = {
+        address: batch_executor.submit(get_account_info, address)
+        for address in addresses
+    }
+
+    results, errors = {}, {}
+    for address, future in futures.items():
+        try:
+            results[address] = future.result()
+        except Exception as e:
+            errors[address] = str(e)
+    return results, errors
+
 def create_dummy_accounts():
-    wallet = generate_faucet_wallet(client, debug=True)
+    wallet = generate_faucet_wallet(_client(), debug=True)
     print("Classic address:", wallet.classic_address)
     print("Seed:", wallet.seed)
 
@@ -70,11 +143,9 @@ def inject_issued_currency(issuer_wallet: Wallet, recipient_address: str, curren
         )
     )
 
-    signed_tx = autofill_and_sign(payment_tx, client, issuer_wallet)
-    response = submit_and_wait(signed_tx, client)
+    response = signing.submit_and_wait(payment_tx, client, issuer_wallet)
     return response.result
 
-issuer_wallet = Wallet.from_seed(seed=os.getenv("WALLET3_SEED"))
 recipient = os.getenv("WALLET1_ADDRESS")
 # inject_issued_currency(
 #     issuer_wallet=issuer_wallet,
@@ -104,7 +175,15 @@ class Transaction:
 
     @staticmethod
     def sign_transaction(payment, wallet, client):
-        signed_tx = xrpl.transaction.autofill_and_sign(payment, client, wallet)
+        """
+        Signs payment with the wallet's next local sequence (signed_tx.sequence).
+
+        The sequence is taken as soon as the blob is signed. A blob that is
+        never submitted leaves a gap, and the wallet's next transaction comes
+        back terPRE_SEQ until this one's LastLedgerSequence passes; callers
+        that drop a signed blob should call signing.resync(wallet.classic_address).
+        """
+        signed_tx = signing.get_preparer(wallet, client).sign(payment)
         max_ledger = signed_tx.last_ledger_sequence
         tx_id = signed_tx.get_hash()
         return signed_tx, max_ledger, tx_id
@@ -112,11 +191,16 @@ class Transaction:
     @staticmethod
     def submit_transaction(signed_tx, client):
         try:
-            tx_response = xrpl.transaction.submit_and_wait(signed_tx, client)
+            tx_response = signing.submit_and_wait(signed_tx, client)
             return tx_response
         except xrpl.transaction.XRPLReliableSubmissionException as e:
             raise Exception(f"Submit failed: {e}")
 
+    @staticmethod
+    def enqueue_transaction(signed_tx):
+        # Non-blocking alternative to submit_transaction; poll submission_queue.get_queue().get(job_id)
+        return submission_queue.get_queue().enqueue(signed_tx.blob())
+
     @staticmethod
     def get_balance(address, client):
         acc_info = AccountInfo(
@@ -148,7 +232,53 @@ class Transaction:
         return Transaction.get_balance(from_account, client)
     
     @staticmethod
-    def get_transaction_history(address, limit = 10):
+    def encode_cursor(marker):
+        # Opaque, URL-safe wrapper around the rippled pagination marker
+        if marker is None:
+            return None
+        raw = json.dumps(marker, separators=(",", ":")).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor):
+        if not cursor:
+            return None
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            return json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        except (ValueError, UnicodeError):
+            raise ValueError("Invalid cursor")
+
+    @staticmethod
+    def decode_ledger_cursor(cursor):
+        # rippled markers are objects; anything else (e.g. a local index cursor) is rejected
+        marker = Transaction.decode_cursor(cursor)
+        if marker is not None and not isinstance(marker, dict):
+            raise ValueError("Invalid cursor")
+        return marker
+
+    @staticmethod
+    def decode_index_cursor(cursor):
+        # Local index cursors are a [ledger_index, tx_index] keyset position
+        position = Transaction.decode_cursor(cursor)
+        if position is not None and not (
+                isinstance(position, list) and len(position) == 2 and all(type(value) is int for value in position)):
+            raise ValueError("Invalid cursor")
+        return position
+
+    @staticmethod
+    def get_transaction_history_page(address, limit = 10, cursor = None):
+        """
+        Fetches one page of an account's transactions, newest first.
+
+        Args:
+            address (str): Classic address of the account.
+            limit (int): Maximum number of transactions in the page.
+            cursor (str): Cursor returned by a previous page, or None for the first page.
+
+        Returns:
+            tuple[list, str]: The transactions and the cursor for the next page (None when done).
+        """
         tx_request = AccountTx(
             account=address,
             ledger_index_min=-1,
@@ -156,9 +286,28 @@ class Transaction:
             limit=limit,
             binary=False,
             forward=False,
+            marker=Transaction.decode_ledger_cursor(cursor),
         )
-        response = client.request(tx_request)
-        return response.result.get("transactions", [])
+        response = _client().request(tx_request)
+        if not response.is_successful():
+            raise XRPLException(response.result.get("error_message") or response.result.get("error"))
+        transactions = response.result.get("transactions", [])
+        return transactions, Transaction.encode_cursor(response.result.get("marker"))
+
+    @staticmethod
+    def get_transaction_history(address, limit = 10):
+        transactions, _ = Transaction.get_transaction_history_page(address, limit)
+        return transactions
+
+    @staticmethod
+    def iter_transaction_history(address, page_size = 200):
+        # Walks the full history one page at a time; only one page is held in memory
+        cursor = None
+        while True:
+            transactions, cursor = Transaction.get_transaction_history_page(address, page_size, cursor)
+            yield from transactions
+            if not cursor:
+                break
 
 
 class TrustLine:
@@ -186,8 +335,7 @@ class TrustLine:
                 value=str(limit)
             )
         )
-        signed_tx = autofill_and_sign(trust_set_tx, client, wallet)  
-        response = submit_and_wait(signed_tx, client)
+        response = signing.submit_and_wait(trust_set_tx, client, wallet)
         return response.result
     
     @staticmethod
@@ -212,8 +360,7 @@ class TrustLine:
                 value="0"  # Setting limit to 0 removes trustline
             )
         )
-        signed_tx = autofill_and_sign(trust_delete_tx, client, wallet)
-        response = submit_and_wait(signed_tx, client)
+        response = signing.submit_and_wait(trust_delete_tx, client, wallet)
         return response.result
     
     @staticmethod
@@ -279,8 +426,7 @@ class TrustLine:
 
         # ===== 3. Submit Transaction =====
         try:
-            signed = autofill_and_sign(payment, client, wallet)
-            response = submit_and_wait(signed, client)
+            response = signing.submit_and_wait(payment, client, wallet)
             
             if response.is_successful():
                 return response.result
@@ -316,66 +462,99 @@ class TrustLine:
             flags=TrustSetFlag.TF_CLEAR_NO_RIPPLE
         )
 
-        signed_tx = autofill_and_sign(trust_set_tx, client, wallet)
-        response = submit_and_wait(signed_tx, client)
+        response = signing.submit_and_wait(trust_set_tx, client, wallet)
         return response.result
     
 class TrustLineAnalytics:
     @staticmethod
+    @lru_cache(maxsize=4096)
     def decode_currency(currency_hex):
         try:
             decoded = bytes.fromhex(currency_hex).decode("ascii").rstrip('\x00')
             return decoded
         except Exception:
             return currency_hex  # fallback to raw if invalid ASCII
-        
+
+    @staticmethod
+    def iter_trustline_pages(address, page_size=400):
+        # Follows the AccountLines marker until every line has been returned
+        marker = None
+        while True:
+            result = _client().request(AccountLines(account=address, limit=page_size, marker=marker)).result
+            yield result.get("lines", [])
+            marker = result.get("marker")
+            if not marker:
+                break
+
     @staticmethod
     def get_trustlines(address):
-        result = client.request(AccountLines(account=address)).result
-        return result.get("lines", [])
+        lines = []
+        for page in TrustLineAnalytics.iter_trustline_pages(address):
+            lines.extend(page)
+        return lines
     
     @staticmethod
     def summarize_trustlines(address):
-        lines = TrustLineAnalytics.get_trustlines(address)
+        return TrustLineAnalytics.summarize_lines(TrustLineAnalytics.get_trustlines(address))
+
+    @staticmethod
+    def summarize_lines(lines):
         summary = {
             "total_trustlines": 0,
             "currencies": {},
         }
-
-        for line in lines:
-            currency = TrustLineAnalytics.decode_currency(line["currency"])
-            issuer = line["account"]
-            balance = float(line["balance"])
-            limit = float(line["limit"])
-
-            if (
-                float(line["balance"]) == 0 and
-                float(line["limit"]) == 0 and
-                float(line.get("limit_peer", 0)) == 0
-            ):
-                continue
-
-            summary["total_trustlines"] += 1
-
-            if currency not in summary["currencies"]:
-                summary["currencies"][currency] = []
-
-            summary["currencies"][currency].append({
-                "issuer": issuer,
-                "balance": balance,
-                "limit": limit,
-            })
+        if not lines:
+            return summary
+
+        # numpy is imported here so that importing this module doesn't pay for it
+        import numpy as np
+
+        # Columnar view of the lines; numpy parses the decimal strings in one pass
+        balances = np.array([line["balance"] for line in lines], dtype=np.float64)
+        limits = np.array([line["limit"] for line in lines], dtype=np.float64)
+        peer_limits = np.array([line.get("limit_peer", 0) for line in lines], dtype=np.float64)
+        keep = np.flatnonzero((balances != 0) | (limits != 0) | (peer_limits != 0))
+        summary["total_trustlines"] = int(keep.size)
+        if not keep.size:
+            return summary
+
+        # Decode each distinct currency code once, then group lines by decoded name
+        raw_codes, raw_group = np.unique(
+            np.array([lines[i]["currency"] for i in keep]), return_inverse=True
+        )
+        decoded = np.array([TrustLineAnalytics.decode_currency(str(code)) for code in raw_codes])
+        currencies, decoded_group = np.unique(decoded, return_inverse=True)
+        group = decoded_group[raw_group]
+
+        kept_balances = balances[keep]
+        kept_limits = limits[keep]
+        total_balances = np.bincount(group, weights=kept_balances, minlength=currencies.size)
+        total_limits = np.bincount(group, weights=kept_limits, minlength=currencies.size)
+
+        # Stable sort keeps each currency's lines in their original order
+        order = np.argsort(group, kind="stable")
+        bounds = np.searchsorted(group[order], np.arange(currencies.size + 1))
+        balance_values = kept_balances.tolist()
+        limit_values = kept_limits.tolist()
+        positions = keep.tolist()
 
         currency_summary = {}
-        for currency, entries in summary["currencies"].items():
-            total_balance = sum(e["balance"] for e in entries)
-            total_limit = sum(e["limit"] for e in entries)
+        for g, currency in enumerate(currencies.tolist()):
+            members = order[bounds[g]:bounds[g + 1]].tolist()
+            summary["currencies"][currency] = [
+                {
+                    "issuer": lines[positions[k]]["account"],
+                    "balance": balance_values[k],
+                    "limit": limit_values[k],
+                }
+                for k in members
+            ]
             currency_summary[currency + "_summary"] = {
-                "total_balance": total_balance,
-                "total_limit": total_limit
+                "total_balance": float(total_balances[g]),
+                "total_limit": float(total_limits[g]),
             }
 
-        summary["currencies"].update(currency_summary)  # safe to do after iteration
+        summary["currencies"].update(currency_summary)
 
         return summary
     
@@ -394,3 +573,7 @@ class TrustLineAnalytics:
 # except XRPLException as e:
 #     print("❌ Failed:", str(e))
 
+
+# The lazy wallets and client are left out so a star import doesn't create them all;
+# import the ones you need by name (see test.py)
+__all__ = [name for name in globals() if not name.startswith("_")]